@@ -38,3 +38,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static', SITE_PREFIX)
 
 # Use this for running a separate beta testing site for people to generate beta seeds.
 BETA = False
+
+# Set this to False to only store seed metadata and regenerate patches on demand instead of storing them.  Patches for
+# seeds from previous versions can't be regenerated, so they're only available if they were stored.
+STORE_PATCHES = True
+
+# Limits on seed generation in each web server process, see settings.py for details.
+GENERATION_ADMISSION = {
+    'queue_size': 4,
+    'queue_timeout': 10.0,
+    'rate': 0.5,
+    'burst': 10,
+}
+
+# API keys for tournament organizers to generate seed pools with the batch API, sent in the X-API-Key header.
+BATCH_API_KEYS = []
@@ -1,5 +1,7 @@
 # Data module for dialog data.
 
+import functools
+
 from randomizer.logic import utils
 from randomizer.logic.patch import Patch
 
@@ -27,19 +29,42 @@ compression_table = [
 
 DIALOG_POINTER_BASE_ADDRESS = 0x37e000
 
+# Order to replace the tokens in, so that overlapping tokens give the shortest encoding.  For example " the" has to come
+# before "is ", so "is the" is written as "is" and " the", and the space runs come after every token with a space.
+_REPLACEMENT_ORDER = [
+    '\n',
+    ' and ',
+    ' to ',
+    ' the',
+    ' you',
+    'is ',
+    "'s ",
+    ' I ',
+    ' so',
+    '    ',
+    '   ',
+    '  ',
+    'in',
+    'Mario',
+    "'",
+    ':',
+    '~',
+]
+
+_ENCODER = utils.TokenEncoder(compression_table, _REPLACEMENT_ORDER, terminator='\x00')
 
-def compress(string):
-    # TODO: Use \x0B to compress longer spacings..
-    for token, char in compression_table:
-        string = string.replace(token, char)
-    return string + '\x00'  # Null terminate strings.
+# Compress a dialog string with the fewest bytes possible using the compression tokens, null terminated.  Results are
+# cached, since the same quiz strings are compressed again for every seed.
+# TODO: Use \x0B to compress longer spacings..
+compress = functools.lru_cache(maxsize=1024)(_ENCODER.encode)
+decompress = _ENCODER.decode
 
 
 # Formatting is tricky. Probably should test it out in the game itself.
 # 1. Use newlines. If a string goes too long, sometimes it wraps around to the
 #    other side and sometimes it softlocks the game. Definitely test these first
 #    before updating.
-wish_strings = list(map(compress, [
+wish_text = [
     '\n\n    I wish for fish.',
     '\n\n    I weesh for quiche.',
     '\n\n    I wish I was a little bit taller.',
@@ -79,7 +104,8 @@ wish_strings = list(map(compress, [
     '\n\n    Tenth enemy has the wish!',
     '\n\n    I wish I could grant\n    meta-wishes...',
     '\n\n    I see the stars pieces,\n    but I have to find an\n    octagon!',
-]))
+]
+wish_strings = list(map(compress, wish_text))
 
 wish_dialogs = [
     3111,
@@ -159,7 +159,8 @@ class Enemy:
         if self.rare_item is not None:
             self.rare_item = self.world.get_item_instance(self.rare_item)
         # Check world type....
-        self.script = list(battlescripts.scripts[self.index])
+        self._script = list(battlescripts.scripts[self.index])
+        self.script_dirty = False
 
     def __str__(self):
         return "<{}>".format(self.name)
@@ -171,6 +172,31 @@ class Enemy:
     def name(self):
         return self.__class__.__name__
 
+    @property
+    def script(self):
+        """Battle script as a list of (command, args) tuples.  Use set_script_command to change a command in place,
+        so the script is marked as changed and gets reassembled.
+
+        :rtype: list[tuple[str, list]]
+        """
+        return self._script
+
+    @script.setter
+    def script(self, value):
+        self._script = value
+        self.script_dirty = True
+
+    def set_script_command(self, i, command):
+        """Replace a command in the battle script.
+
+        :param i: Index of the command in the script.
+        :type i: int
+        :param command: New (command, args) tuple.
+        :type command: tuple[str, list]
+        """
+        self._script[i] = command
+        self.script_dirty = True
+
     @staticmethod
     def round_for_battle_script(val):
         """Round a HP value for battle event data.  This means round to an integer, and make sure it does have the
@@ -217,6 +243,20 @@ class Enemy:
         hp = self.hp if self.hp >= 10 else 100
         return hp * max(self.attack, self.magic_attack, 1)
 
+    @staticmethod
+    def get_ranked_candidates(world):
+        """Get all non-boss enemies sorted by rank, for use in finding similar enemies.
+
+        Args:
+            world (randomizer.logic.main.GameWorld):
+
+        Returns:
+            list[Enemy]: Sorted list of enemies.
+
+        """
+        candidates = [e for e in world.enemies if not e.boss]
+        return sorted(candidates, key=lambda e: (e.rank, e.index))
+
     @property
     def psychopath_text(self):
         """Make Psychopath text to show elemental weaknesses and immunities.
@@ -270,9 +310,12 @@ class Enemy:
 
         return desc
 
-    def get_similar(self):
+    def get_similar(self, candidates=None):
         """Get a similar enemy to this one for formation shuffling based on rank.
 
+        :param candidates: Optional list of non-boss enemies already sorted by rank, to avoid re-sorting on every call
+        when the enemy stats aren't changing.
+        :type candidates: list[Enemy]
         :rtype: Enemy
         """
         # If we're a boss enemy, treat as unique.
@@ -280,8 +323,8 @@ class Enemy:
             return self
 
         # Get all non-boss candidates sorted by rank.
-        candidates = [e for e in self.world.enemies if not e.boss]
-        candidates = sorted(candidates, key=lambda e: (e.rank, e.index))
+        if candidates is None:
+            candidates = self.get_ranked_candidates(self.world)
 
         # If this is a special enemy, don't replace it.
         if self.rank < 0:
@@ -308,7 +351,7 @@ class Enemy:
             # Skip any HP checks for 0 because these are death checks that end the fight.
             if name == 'if_hp' and val[0] > 0:
                 hp = self.round_for_battle_script(self.hp * hps[dex])
-                script[i] = ('if_hp', [hp])
+                self.set_script_command(i, ('if_hp', [hp]))
                 dex += 1
                 if dex == len(hps):
                     break
@@ -391,7 +434,7 @@ class Enemy:
                 name, args = self.script[i]
                 if name == 'if_item':
                     # Good luck using that in battle
-                    self.script[i] = ('if_item', [items.BrightCard])
+                    self.set_script_command(i, ('if_item', [items.BrightCard]))
 
     @classmethod
     def build_psychopath_patch(cls, world):
@@ -403,32 +446,28 @@ class Enemy:
         """
         patch = Patch()
 
-        # Begin text data with a single null byte to use for all empty text to save space.
-        pointer_data = bytearray()
-        text_data = bytearray()
-        text_data.append(0x00)
-
         # Make list of blank text for all enemies, and get text for each valid enemy we have based on index.
         descriptions = [''] * NUM_ENEMIES
         for enemy in world.enemies:
             descriptions[enemy.index] = enemy.psychopath_text
 
+        # Store each distinct text once, with null bytes to terminate them.  Text that's the end of another one
+        # (including empty text) points into it.
+        descriptions = [desc.encode('latin1') + bytes([0x00]) for desc in descriptions]
+        stored, locations = utils.pool_strings(descriptions)
+
+        text_data = bytearray()
+        stored_pointers = []
+        for text in stored:
+            stored_pointers.append(cls.BASE_PSYCHOPATH_DATA_ADDRESS + len(text_data) -
+                                   cls.PSYCHOPATH_DATA_POINTER_OFFSET)
+            text_data += text
+
         # Now build the actual pointer data.
+        pointer_data = bytearray()
         for desc in descriptions:
-            # If the description is empty, just use the null byte at the very beginning.
-            if not desc:
-                pointer = cls.BASE_PSYCHOPATH_DATA_ADDRESS - cls.PSYCHOPATH_DATA_POINTER_OFFSET
-                pointer_data += utils.ByteField(pointer, num_bytes=2).as_bytes()
-                continue
-
-            # Compute pointer from base address and current data length.
-            pointer = cls.BASE_PSYCHOPATH_DATA_ADDRESS + len(text_data) - cls.PSYCHOPATH_DATA_POINTER_OFFSET
-            pointer_data += utils.ByteField(pointer, num_bytes=2).as_bytes()
-
-            # Add null byte to terminate the text string.
-            desc = desc.encode('latin1')
-            desc += bytes([0x00])
-            text_data += desc
+            index, offset = locations[desc]
+            pointer_data += utils.ByteField(stored_pointers[index] + offset, num_bytes=2).as_bytes()
 
         # Sanity check that pointer data has the correct number of items.
         if len(pointer_data) != NUM_ENEMIES * 2:
@@ -9,6 +9,16 @@ from randomizer.logic.patch import Patch
 from .characters import Mario, Mallow, Geno, Bowser, Peach
 
 
+# Characters the menu font has something else in place of in item descriptions, so descriptions can be written as plain
+# text.  Descriptions are null terminated.
+_DESCRIPTION_ENCODER = utils.TokenEncoder([
+    ('\n', '\x01'),
+    ("'", '~'),
+    ('-', '}'),
+    ('&', '\x9C'),
+], terminator='\x00')
+
+
 class ItemShuffleType(enum.Enum):
     """Enumeration for key item types for shuffling."""
     Required = enum.auto()
@@ -379,15 +389,9 @@ class Item:
         """
         patch = Patch()
 
-        # Begin text data with a single null byte to use for all empty descriptions to save space.
-        pointer_data = bytearray()
         text_data = []
         for i in range(len(cls.BASE_DESC_DATA_ADDRESSES)):
             text_data.append(bytearray())
-        text_data[0].append(0x00)
-
-        # Track current base address for the text.  We have multiple banks to split the text across.
-        current_bank = 0
 
         # Make list of blank descriptions for all items, and get description for each valid item we have based on index.
         descriptions = [''] * cls.NUM_ITEMS
@@ -399,33 +403,34 @@ class Item:
                 desc = item.description
             descriptions[item.index] = desc
 
-        # Now build the actual pointer data.
-        for desc in descriptions:
-            # If the description is empty, just use the null byte at the very beginning.
-            if not desc:
-                pointer = cls.BASE_DESC_DATA_ADDRESSES[0][0] - cls.DESC_DATA_POINTER_OFFSET
-                pointer_data += utils.ByteField(pointer, num_bytes=2).as_bytes()
-                continue
-
-            # Compute pointer from base address and current data length.  If we exceed the ending address of the current
-            # data bank, move to the next one.  If we run out, it's an error.
+        # Store each distinct description once, with null bytes to terminate them.  Descriptions that are the end of
+        # another one (including empty ones) point into it.
+        descriptions = [_DESCRIPTION_ENCODER.encode(desc).encode('latin1') for desc in descriptions]
+        stored, locations = utils.pool_strings(descriptions)
+
+        # Place the stored text in the first data bank it fits in, moving to the next bank when one fills up.  If we run
+        # out, it's an error.
+        current_bank = 0
+        stored_pointers = []
+        for text in stored:
             while True:
                 pointer = cls.BASE_DESC_DATA_ADDRESSES[current_bank][0] + len(text_data[current_bank])
-                if (pointer + len(desc) + 1) > cls.BASE_DESC_DATA_ADDRESSES[current_bank][1]:
+                if (pointer + len(text)) > cls.BASE_DESC_DATA_ADDRESSES[current_bank][1]:
                     current_bank += 1
                     if current_bank >= len(cls.BASE_DESC_DATA_ADDRESSES):
                         raise ValueError("Text descriptions too long")
                     continue
 
                 # Subtract base pointer offset from computed final address.
-                pointer -= cls.DESC_DATA_POINTER_OFFSET
-                pointer_data += utils.ByteField(pointer, num_bytes=2).as_bytes()
+                stored_pointers.append(pointer - cls.DESC_DATA_POINTER_OFFSET)
+                text_data[current_bank] += text
                 break
 
-            # Add null byte to terminate the text string.
-            desc = desc.encode('latin1')
-            desc += bytes([0x00])
-            text_data[current_bank] += desc
+        # Now build the actual pointer data.
+        pointer_data = bytearray()
+        for desc in descriptions:
+            index, offset = locations[desc]
+            pointer_data += utils.ByteField(stored_pointers[index] + offset, num_bytes=2).as_bytes()
 
         # Sanity check that pointer data has the correct number of items.
         if len(pointer_data) != cls.NUM_ITEMS * 2:
@@ -1,5 +1,5 @@
 from . import utils
-from .dialogs import allocate_string
+from .freespace import FreeSpace
 from .patch import Patch
 from randomizer.data import battlescripts
 from randomizer.data.attacks import EnemyAttack
@@ -356,29 +356,40 @@ class BattleScript:
         return self.append('start_counter')
 
 
+# Assembled vanilla battle scripts, so only scripts that were changed need to be assembled for each seed.
+_VANILLA_SCRIPT_BYTES = [bytes(BattleScriptAssember.assemble_from_tuples(script)) for script in battlescripts.scripts]
+
+
 def assemble_battle_scripts(world):
     patch = Patch()
 
     if not world.open_mode:
         return patch
 
-    free_list = {
+    free_space = FreeSpace({
         0x3932AA: 10058, # Original battle script location
         0x39F400: 3072,  # Lazy shell also saves scripts here
-    }
+    })
+    world.free_space['battle_scripts'] = free_space
 
-    ptr_table_base = 0x3930AA
+    all_script_bytes = []
     for index in range(256):
         enemy = world.enemies_dict.get(index, None)
         if enemy:
             enemy.patch_script()
-            script = enemy.script
+        if enemy and enemy.script_dirty:
+            all_script_bytes.append(BattleScriptAssember.assemble_from_tuples(enemy.script))
         else:
             # This makes round tripping possible
             # Might be worth it to remove them and save on space...
-            script = battlescripts.scripts[index]
-        script_bytes = BattleScriptAssember.assemble_from_tuples(script)
-        script_base = allocate_string(len(script_bytes), free_list)
+            all_script_bytes.append(_VANILLA_SCRIPT_BYTES[index])
+
+    script_bases = free_space.allocate_all([len(script_bytes) for script_bytes in all_script_bytes])
+    if script_bases is None:
+        raise ValueError("Unable to allocate space for battle scripts: {!r}".format(free_space.report()))
+
+    ptr_table_base = 0x3930AA
+    for index, (script_bytes, script_base) in enumerate(zip(all_script_bytes, script_bases)):
         offset = index * 2
         script_short = script_base & 0xFFFF
 
@@ -53,7 +53,12 @@ preloaded_events = {}
 INSERT_NORTHWEST = -75
 
 def patch_overworld_bosses(world):
-    """
+    """Rewrite the overworld boss NPCs to match the shuffled bosses.
+
+    Each location's rewritten action scripts are packed into the free events of banks 1E-21 in the order of
+    world.boss_locations, and sprites that need a mold set share the preloaders in event 1110.  Where one location's
+    scripts go depends on every location before it, and some sprites depend on randomized boss stats and the party
+    join order, so the output can't be built from independent per-location pieces.
 
     Args:
         world (randomizer.logic.main.GameWorld):
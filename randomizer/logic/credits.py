@@ -1,7 +1,8 @@
 import random
 
 from randomizer.logic import utils
-from randomizer.logic.dialogs import allocate_string
+from randomizer.logic.freespace import FreeSpace
+from randomizer.logic.fragments import fragment
 from randomizer.logic.patch import Patch
 
 
@@ -18,11 +19,18 @@ IMPORTANT NOTES ABOUT MODIFYING:
 
 EMPTY_STRING = '                                       '
 
+# The credits font has space, period and underscore where the punctuation after Z is in ASCII.
+_ENCODER = utils.TokenEncoder([
+    (' ', '\\'),
+    ('.', '['),
+    ('_', ']'),
+])
+
 def to_str(string):
-    return ''.join([chr(i + ord('A') - 1) for i in string]).replace('\\', ' ').replace('[', '.')
+    return _ENCODER.decode(''.join([chr(i + ord('A') - 1) for i in string]))
 
 def inv_str(string):
-    string = string.replace(' ', '\\').replace('.', '[').replace('_', ']')
+    string = _ENCODER.encode(string)
     return chr(len(string)) + ''.join([chr(ord(i) - ord('A') + 1) for i in string])
 
 class Credits(object):
@@ -97,17 +105,19 @@ class Credits(object):
         # This is very important.
         self.acc += (3380 - len(self.acc)) * [0]
 
-        free_list = {
+        self.free_space = FreeSpace({
             0x3f9c40: 952,
             credit_start + len(self.acc): credit_len - len(self.acc),
             string_table_start + string_table_size: 2080 - string_table_size
-        }
+        })
 
         patch = Patch()
         patch.add_data(credit_start, bytearray(self.acc))
-        for i in range(len(self.strings)):
-            string = inv_str(self.strings[i])
-            base = allocate_string(len(string), free_list)
+        strings = [inv_str(self.strings[i]) for i in range(len(self.strings))]
+        bases = self.free_space.allocate_all([len(string) for string in strings])
+        if bases is None:
+            raise ValueError("Unable to allocate space for credits strings")
+        for i, (string, base) in enumerate(zip(strings, bases)):
             patch.add_data(base, string)
             patch.add_data(string_table_start + i*2, utils.ByteField(base & 0xFFFF, num_bytes=2).as_bytes())
 
@@ -131,6 +141,16 @@ DEV_MESSAGES = [
 # Takes world because everything does.
 # If we every implement stats, we'll need it, probably.
 def update_credits(world):
+    # The credits are the same for every seed apart from the dev message, so they're only built once for each message.
+    # Each world gets its own copy of the patch and free space.
+    patch, free_space = _build_credits(world, random.choice(DEV_MESSAGES))
+    world.free_space['credits'] = free_space
+    return patch
+
+
+# If we add stats, they need to be declared as dependencies here.
+@fragment()
+def _build_credits(world, dev_message):
     credits = Credits()
     credits.begin_credits()
     credits.add_credit(0x80, 0x80, 0xc0, 'ORIGINAL')
@@ -448,7 +468,7 @@ def update_credits(world):
     credits.add_title(0x80, 0x00, 0x08, 'SPECIAL MESSAGE FROM THE DEVS')
     credits.end_titles(END_TITLES_DELAY)
 
-    dev_line1, dev_line2, dev_line3 = random.choice(DEV_MESSAGES)
+    dev_line1, dev_line2, dev_line3 = dev_message
     credits.begin_credits()
     credits.add_credit(0x80, 0x80, 0xc0, dev_line1)
     credits.add_credit(0x80, 0x40, 0x81, dev_line2)
@@ -456,4 +476,5 @@ def update_credits(world):
 
     credits.end_thing(END_CREDITS_DELAY_1) # Yeah, my abstraction breaks at the end.
 
-    return credits.finalize()
+    patch = credits.finalize()
+    return patch, credits.free_space
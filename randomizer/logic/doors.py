@@ -1,13 +1,110 @@
 # Logic module for Bowser Door randomization.
 
+import functools
 import inspect
 import random
 
 from randomizer import data
 from randomizer.logic import flags
+from randomizer.logic.fragments import fragment
 from randomizer.logic.patch import Patch
 
 
+@functools.lru_cache(maxsize=None)
+def _bowser_rooms():
+    """
+    Returns:
+        list[type]: All Bowser's Keep room classes.
+
+    """
+    return [
+        cls
+        for name, cls in inspect.getmembers(data.locations)
+        if inspect.isclass(cls) and issubclass(cls, data.locations.BowserRoom) and cls != data.locations.BowserRoom
+    ]
+
+
+@fragment()
+def _patch_shuffled_doors(world):
+    """Patch data for shuffling Bowser's Keep doors that doesn't depend on the room order, so it's only built once.
+
+    Args:
+        world (randomizer.logic.main.GameWorld):
+
+    Returns:
+        randomizer.logic.patch.Patch: Patch data.
+
+    """
+    patch = Patch()
+
+    # remove backward exits
+    for i in _bowser_rooms():
+        if i.backward_exit_byte > 0:
+            patch.add_data(i.backward_exit_byte, 15)
+        if i.backward_event_byte > 0:
+            patch.add_data(i.backward_event_byte, 15)
+        if i.is_final:
+            patch.add_data(i.change_event_byte, [0x4C, 0x81])
+
+    # exits and event exits need to go to room 240, patch room 240 to run event 332 on load and music
+    patch.add_data(0x1D40D5, [0xF0, 0xA0, 0x93, 0x1C, 0x05, 0x02, 0x39, 0xE0, 0x81, 0xF0, 0xA0])
+    patch.add_data(0x1D4307, [0xF0, 0xA0])
+    patch.add_data(0x1D46E4, [0xF0, 0xA0, 0x92, 0x1B, 0x03, 0x06, 0x2F, 0xE1, 0x81, 0x42, 0xA1, 0x87, 0x76, 0x02,
+                              0x1A, 0x58, 0x62, 0x81, 0xF0, 0xA0, 0x95, 0x56, 0x02, 0x16, 0x7B, 0xE0, 0x81, 0xF0,
+                              0xA0, 0x96, 0x19, 0x00, 0x02, 0x3F, 0xE0, 0x81, 0xF0, 0xA0, 0x96, 0x19, 0x00, 0x02,
+                              0x3F, 0xE0, 0x81, 0xF0, 0xA0])
+    patch.add_data(0x204E8D, [0xF0, 0x80, 0x02, 0x37, 0xE0, 0xFE, 0x68, 0xF0, 0x80])
+    patch.add_data(0x20502A, [0xF0, 0x80])
+    patch.add_data(0x205285, [0xF0, 0x80])
+    patch.add_data(0x20F217, [0x42, 0x4C, 0x01])
+    # battle rooms should load BK2 music
+    patch.add_data(0x20F6CD, [0x42])
+    patch.add_data(0x20F6E8, [0x42])
+    patch.add_data(0x20FB8D, [0x42])
+    patch.add_data(0x20FBA8, [0x42])
+    patch.add_data(0x20FBC3, [0x42])
+    patch.add_data(0x20FBE4, [0x42])
+    # patch final rooms so that they always run event 332 on exit
+    patch.add_data(0x20F703, [0x4C, 0x81])
+    patch.add_data(0x20FB6C, [0x4C, 0x81])
+    patch.add_data(0x20FB75, [0x4C, 0x81])
+    patch.add_data(0x20FBDE, [0x4C, 0x81])
+    patch.add_data(0x20FC11, [0x4C, 0x81])
+    patch.add_data(0x20FC1D, [0x4C, 0x81])
+
+    # modify event 2121 to set tries counter to 10 at the start of each of the 6 starter rooms and then load
+    # their original entrance event, and initiate counter
+    # start of event checks to see if it's a retry on a platforming room - specifically for Z-platform room
+    event_patch_data = [0xE0, 0x2B, 0x00, 0xBA, 0x7A, 0xE4, 0x2D, 0x01, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x05, 0x00,
+                        0xBD, 0x7A, 0xE4, 0x2D, 0x09, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x0D, 0x00, 0xBD, 0x7A, 0xE4,
+                        0x2D, 0x11, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x15, 0x00, 0xBD, 0x7A, 0xA8, 0x2B, 0x0A, 0xC3,
+                        0xE2, 0xCF, 0x01, 0xDC, 0x7A, 0xE2, 0xD3, 0x01, 0xE4, 0x7A, 0xE2, 0xC8, 0x01, 0xEC, 0x7A,
+                        0xE2, 0xD1, 0x01, 0xF4, 0x7A, 0xE2, 0xD2, 0x01, 0xFC, 0x7A, 0xE2, 0xC9, 0x01, 0x04, 0x7B,
+                        0xB0, 0x2D, 0x01, 0x00, 0xD0, 0x1A, 0x0D, 0xFE, 0xB0, 0x2D, 0x05, 0x00, 0xD0, 0x0F, 0x00,
+                        0xFE, 0xB0, 0x2D, 0x09, 0x00, 0xD0, 0x2C, 0x07, 0xFE, 0xB0, 0x2D, 0x0D, 0x00, 0xD0, 0x1E,
+                        0x0D, 0xFE, 0xB0, 0x2D, 0x11, 0x00, 0xD0, 0x24, 0x0D, 0xFE, 0xB0, 0x2D, 0x15, 0x00, 0xD0,
+                        0x2B, 0x07, 0xFE]
+    patch.add_data(0x1F7A91, event_patch_data)
+    i = 0x1F7A91 + len(event_patch_data)
+    while i <= 0x1F7B0C:
+        patch.add_data(i, 0x9B)
+        i += 1
+
+    # fix Z-platform room failing to reload on failure - force it to run entrance event on reload at original coords
+    # this only affects this one room for some reason
+    # this means that if you fail at any point in this room, you will go back to the beginning of it
+    # oh well. git gud
+    patch.add_data(0x1F5666, [0x81, 0x04, 0x3A, 0xE5])
+
+    # remove any 10-try set events from rooms so that they dont reset if in the middle of a chain
+    patch.add_data(0x1F5462, [0xA6, 0xAC, 0xD0, 0x25, 0x07, 0xFE, 0x9B, 0xFE])
+    patch.add_data(0x1F5531,
+                   [0xA6, 0xAC, 0x9C, 0x0B, 0x15, 0xF2, 0x36, 0x03, 0x16, 0xF2, 0x36, 0x03, 0x17, 0xF2, 0x36, 0x03,
+                    0xD0, 0x25, 0x07, 0xFE, 0x9B, 0xFE])
+
+    return patch
+
+
 def patch_bowser_doors(world):
     """
 
@@ -21,92 +118,22 @@ def patch_bowser_doors(world):
     patch = Patch()
 
     if world.settings.is_flag_enabled(flags.ShuffleBowsersKeep):
-        def find_subclasses(module, clazz):
-            return [
-                cls
-                for name, cls in inspect.getmembers(module)
-                if inspect.isclass(cls) and issubclass(cls, clazz) and cls != clazz
-            ]
-
-        all_rooms = find_subclasses(data.locations, data.locations.BowserRoom)
+        patch += _patch_shuffled_doors(world)
+
+        all_rooms = _bowser_rooms()
         doors = [[], [], [], [], [], []]
         assigned_rooms = []
 
-        # remove backward exits
-        for i in all_rooms:
-            if i.backward_exit_byte > 0:
-                patch.add_data(i.backward_exit_byte, 15)
-            if i.backward_event_byte > 0:
-                patch.add_data(i.backward_event_byte, 15)
-            if i.is_final:
-                patch.add_data(i.change_event_byte, [0x4C, 0x81])
-
         for i in range(0, len(doors)):
             for j in range(0, 3):
                 room = random.choice([r for r in all_rooms if r not in assigned_rooms])
                 doors[i].append(room)
                 assigned_rooms.append(room)
 
-        # exits and event exits need to go to room 240, patch room 240 to run event 332 on load and music
-        patch.add_data(0x1D40D5, [0xF0, 0xA0, 0x93, 0x1C, 0x05, 0x02, 0x39, 0xE0, 0x81, 0xF0, 0xA0])
-        patch.add_data(0x1D4307, [0xF0, 0xA0])
-        patch.add_data(0x1D46E4, [0xF0, 0xA0, 0x92, 0x1B, 0x03, 0x06, 0x2F, 0xE1, 0x81, 0x42, 0xA1, 0x87, 0x76, 0x02,
-                                  0x1A, 0x58, 0x62, 0x81, 0xF0, 0xA0, 0x95, 0x56, 0x02, 0x16, 0x7B, 0xE0, 0x81, 0xF0,
-                                  0xA0, 0x96, 0x19, 0x00, 0x02, 0x3F, 0xE0, 0x81, 0xF0, 0xA0, 0x96, 0x19, 0x00, 0x02,
-                                  0x3F, 0xE0, 0x81, 0xF0, 0xA0])
-        patch.add_data(0x204E8D, [0xF0, 0x80, 0x02, 0x37, 0xE0, 0xFE, 0x68, 0xF0, 0x80])
-        patch.add_data(0x20502A, [0xF0, 0x80])
-        patch.add_data(0x205285, [0xF0, 0x80])
-        patch.add_data(0x20F217, [0x42, 0x4C, 0x01])
-        # battle rooms should load BK2 music
-        patch.add_data(0x20F6CD, [0x42])
-        patch.add_data(0x20F6E8, [0x42])
-        patch.add_data(0x20FB8D, [0x42])
-        patch.add_data(0x20FBA8, [0x42])
-        patch.add_data(0x20FBC3, [0x42])
-        patch.add_data(0x20FBE4, [0x42])
-        # patch final rooms so that they always run event 332 on exit
-        patch.add_data(0x20F703, [0x4C, 0x81])
-        patch.add_data(0x20FB6C, [0x4C, 0x81])
-        patch.add_data(0x20FB75, [0x4C, 0x81])
-        patch.add_data(0x20FBDE, [0x4C, 0x81])
-        patch.add_data(0x20FC11, [0x4C, 0x81])
-        patch.add_data(0x20FC1D, [0x4C, 0x81])
-
-        # modify event 2121 to set tries counter to 10 at the start of each of the 6 starter rooms and then load
-        # their original entrance event, and initiate counter
-        # start of event checks to see if it's a retry on a platforming room - specifically for Z-platform room
-        event_patch_data = [0xE0, 0x2B, 0x00, 0xBA, 0x7A, 0xE4, 0x2D, 0x01, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x05, 0x00,
-                            0xBD, 0x7A, 0xE4, 0x2D, 0x09, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x0D, 0x00, 0xBD, 0x7A, 0xE4,
-                            0x2D, 0x11, 0x00, 0xBD, 0x7A, 0xE4, 0x2D, 0x15, 0x00, 0xBD, 0x7A, 0xA8, 0x2B, 0x0A, 0xC3,
-                            0xE2, 0xCF, 0x01, 0xDC, 0x7A, 0xE2, 0xD3, 0x01, 0xE4, 0x7A, 0xE2, 0xC8, 0x01, 0xEC, 0x7A,
-                            0xE2, 0xD1, 0x01, 0xF4, 0x7A, 0xE2, 0xD2, 0x01, 0xFC, 0x7A, 0xE2, 0xC9, 0x01, 0x04, 0x7B,
-                            0xB0, 0x2D, 0x01, 0x00, 0xD0, 0x1A, 0x0D, 0xFE, 0xB0, 0x2D, 0x05, 0x00, 0xD0, 0x0F, 0x00,
-                            0xFE, 0xB0, 0x2D, 0x09, 0x00, 0xD0, 0x2C, 0x07, 0xFE, 0xB0, 0x2D, 0x0D, 0x00, 0xD0, 0x1E,
-                            0x0D, 0xFE, 0xB0, 0x2D, 0x11, 0x00, 0xD0, 0x24, 0x0D, 0xFE, 0xB0, 0x2D, 0x15, 0x00, 0xD0,
-                            0x2B, 0x07, 0xFE]
-        patch.add_data(0x1F7A91, event_patch_data)
-        i = 0x1F7A91 + len(event_patch_data)
-        while i <= 0x1F7B0C:
-            patch.add_data(i, 0x9B)
-            i += 1
-
-        # fix Z-platform room failing to reload on failure - force it to run entrance event on reload at original coords
-        # this only affects this one room for some reason
-        # this means that if you fail at any point in this room, you will go back to the beginning of it
-        # oh well. git gud
-        patch.add_data(0x1F5666, [0x81, 0x04, 0x3A, 0xE5])
-
         # 6 entrance doors
         initial_door_room_addresses = [0x205CCD, 0x205CD4, 0x205CDB, 0x205CE2, 0x205CE9, 0x205CF0]
         initial_door_coord_addresses = [0x205CCF, 0x205CD6, 0x205CDD, 0x205CE4, 0x205CEB, 0x205CF2]
 
-        # remove any 10-try set events from rooms so that they dont reset if in the middle of a chain
-        patch.add_data(0x1F5462, [0xA6, 0xAC, 0xD0, 0x25, 0x07, 0xFE, 0x9B, 0xFE])
-        patch.add_data(0x1F5531,
-                       [0xA6, 0xAC, 0x9C, 0x0B, 0x15, 0xF2, 0x36, 0x03, 0x16, 0xF2, 0x36, 0x03, 0x17, 0xF2, 0x36, 0x03,
-                        0xD0, 0x25, 0x07, 0xFE, 0x9B, 0xFE])
-
         # DYNAMIC WRITING OF EVENT 332 #
         # man, this is some shit #
         # dont ask me what the hell i did here but it apparently works #
@@ -1,12 +1,18 @@
 # enemy randomization logic.
 
 import random
-from functools import reduce
 
 from randomizer.data import bosses, enemies
-from randomizer.data.formations import FormationMember
+from randomizer.data.formations import EnemyFormation, FormationMember
 from . import flags, utils
 
+# Distances between every pair of valid formation coordinates, indexed by position in the coordinate list.  The
+# coordinate set is fixed, so compute these once instead of for every candidate of every formation.
+COORDINATE_DISTANCES = tuple(
+    tuple(((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5 for x2, y2 in EnemyFormation.VALID_COORDINATES)
+    for x1, y1 in EnemyFormation.VALID_COORDINATES
+)
+
 
 def _randomize_enemy_attack(attack):
     """Randomize a single enemy attack.
@@ -41,7 +47,8 @@ def _randomize_enemy_attack(attack):
         if attack.buffs and random.randint(1, 2) == 2:
             unused = list({3, 4, 5, 6} - set(attack.buffs))
             if unused:
-                attack.buffs.append(random.choice(unused))
+                # Build a new list, the default one is shared by the attack class across seeds.
+                attack.buffs = attack.buffs + [random.choice(unused)]
 
     # If there are status effects, randomize them.
     if attack.status_effects:
@@ -144,20 +151,37 @@ def _randomize_enemy(enemy):
     enemy.flower_bonus_chance = random.randint(0, 5) + random.randint(0, 5)
 
 
-def _randomize_formation(formation):
-    """Randomize this enemy formation."""
-
-    def get_distance(x1, y1, x2, y2):
-        return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
+def _select_most_distance(possible_points, points):
+    """Select the candidate coordinate that is furthest from all the already placed coordinates, where "furthest" is
+    the highest product of the distances to each placed point.  Ties go to the earliest candidate.
 
-    def get_collective_distance(x1, y1, points):
-        distances = [get_distance(x1, y1, x2, y2) for x2, y2 in points]
-        return reduce(lambda a, b: a * b, distances, 1)
+    Args:
+        possible_points (list[int]): Candidate coordinate indexes.
+        points (list[int]): Already placed coordinate indexes.
 
-    def select_most_distance(possible_points, points):
-        chosen = max(possible_points, key=lambda c: get_collective_distance(c[0], c[1], points))
-        return chosen
+    Returns:
+        int: Chosen coordinate index.
+    """
+    chosen = None
+    chosen_distance = None
+    for candidate in possible_points:
+        distances = COORDINATE_DISTANCES[candidate]
+        collective_distance = 1
+        for point in points:
+            collective_distance *= distances[point]
+        if chosen is None or collective_distance > chosen_distance:
+            chosen = candidate
+            chosen_distance = collective_distance
+    return chosen
+
+
+def _randomize_formation(formation, ranked_enemies):
+    """Randomize this enemy formation.
 
+    Args:
+        formation (randomizer.data.formations.EnemyFormation):
+        ranked_enemies (list[randomizer.data.enemies.Enemy]): Non-boss enemies sorted by rank for similar picks.
+    """
     # Max enemies for a given group.
     max_enemies = 6
 
@@ -169,7 +193,7 @@ def _randomize_formation(formation):
     candidates = list(formation.leaders)
     while len(candidates) < 3:
         base = random.choice(candidates)
-        new = base.get_similar()
+        new = base.get_similar(ranked_enemies)
         if new not in candidates:
             candidates.append(new)
 
@@ -185,8 +209,8 @@ def _randomize_formation(formation):
 
     # Fill out the number of enemies with randomly chosen candidates, but make sure VRAM palette totals less than
     # 64 because the VRAM can only hold so much palette data at once.
+    vram_total = sum([e.palette for e in chosen_enemies])
     while len(chosen_enemies) < num_enemies:
-        vram_total = sum([e.palette for e in chosen_enemies])
         sub_candidates = candidates + chosen_enemies
 
         # Exclude any enemies that are unique per battle.
@@ -195,26 +219,31 @@ def _randomize_formation(formation):
         sub_candidates = [e for e in sub_candidates if vram_total + e.palette <= 64]
         if not sub_candidates:
             break
-        chosen_enemies.append(random.choice(sub_candidates))
+        enemy = random.choice(sub_candidates)
+        chosen_enemies.append(enemy)
+        vram_total += enemy.palette
 
     random.shuffle(chosen_enemies)
 
-    # Randomize coordinates for the chosen enemies.
+    # Randomize coordinates for the chosen enemies.  Work with indexes into the valid coordinate list so we can use
+    # the precomputed distances.
+    num_coordinates = len(formation.VALID_COORDINATES)
     formation.members = []
     done_coordinates = []
     for i, enemy in enumerate(chosen_enemies):
         if not done_coordinates:
-            x, y = random.choice(formation.VALID_COORDINATES)
+            coordinate = random.choice(range(num_coordinates))
         else:
-            candidates = random.sample(formation.VALID_COORDINATES, len(chosen_enemies) * 2)
-            x, y = select_most_distance(candidates, done_coordinates)
+            candidates = random.sample(range(num_coordinates), len(chosen_enemies) * 2)
+            coordinate = _select_most_distance(candidates, done_coordinates)
 
-        done_coordinates.append((x, y))
+        done_coordinates.append(coordinate)
+        x, y = formation.VALID_COORDINATES[coordinate]
         formation.members.append(FormationMember(i, False, enemy, x, y))
 
     formation.members.sort(key=lambda m: m.index)
 
-    done_coordinates = sorted(done_coordinates)
+    done_coordinates = sorted(formation.VALID_COORDINATES[c] for c in done_coordinates)
     for i, (x, y) in enumerate(done_coordinates):
         formation.members[i].x_pos = x
         formation.members[i].y_pos = y
@@ -329,8 +358,10 @@ def randomize_all(world):
 
     # Shuffle enemy formations.
     if world.settings.is_flag_enabled(flags.EnemyFormations):
+        # Enemy stats are final at this point, so rank the similar enemy candidates once for all formations.
+        ranked_enemies = enemies.Enemy.get_ranked_candidates(world)
         for formation in world.enemy_formations:
-            _randomize_formation(formation)
+            _randomize_formation(formation, ranked_enemies)
 
     # XP boost.
     if world.settings.is_flag_enabled(flags.ExperienceBoost2x):
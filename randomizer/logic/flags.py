@@ -1,9 +1,24 @@
 # Flag definitions and logic.
 
+import functools
+
 from django.utils.html import mark_safe
 from markdown import markdown
 
 
+@functools.lru_cache(maxsize=None)
+def _markdown(text):
+    """Render flag description text as markdown.  Flag text is constant, so each one is only rendered once.
+
+    Args:
+        text (str): Markdown text.
+
+    Returns:
+        str: Rendered HTML marked as safe.
+    """
+    return mark_safe(markdown(text, safe_mode='escape'))
+
+
 # ************************************** Flag classes
 
 class FlagError(ValueError):
@@ -23,25 +38,25 @@ class Flag:
 
     @classmethod
     def description_as_markdown(cls):
-        return mark_safe(markdown(cls.description, safe_mode='escape'))
+        return _markdown(cls.description)
 
     @classmethod
     def description_or_name_as_markdown(cls):
         if cls.description:
-            return mark_safe(markdown(cls.description, safe_mode='escape'))
+            return _markdown(cls.description)
         else:
-            return mark_safe(markdown(cls.name, safe_mode='escape'))
+            return _markdown(cls.name)
 
     @classmethod
     def inverse_description_as_markdown(cls):
-        return mark_safe(markdown(cls.inverse_description, safe_mode='escape'))
+        return _markdown(cls.inverse_description)
 
     @classmethod
     def inverse_description_or_name_as_markdown(cls):
         if cls.inverse_description:
-            return mark_safe(markdown(cls.inverse_description, safe_mode='escape'))
+            return _markdown(cls.inverse_description)
         else:
-            return mark_safe(markdown("(" + cls.name + ")", safe_mode='escape'))
+            return _markdown("(" + cls.name + ")")
 
     @classmethod
     def available_in_mode(cls, mode):
@@ -1173,3 +1188,34 @@ PRESETS = (
     ExpertPreset,
     QuickPreset,
 )
+
+
+def _iter_flags(flag_list):
+    """Iterate through a list of flags and all their choices and options recursively.
+
+    Args:
+        flag_list (list[Flag]): Flags to iterate through.
+
+    """
+    for flag in flag_list:
+        yield flag
+        yield from _iter_flags(flag.choices)
+        yield from _iter_flags(flag.options)
+
+
+def _build_flag_bits():
+    """
+    Returns:
+        dict[type, int]: Every flag available on the site mapped to a unique bit.
+
+    """
+    bits = {}
+    for category in CATEGORIES:
+        for flag in _iter_flags(category.flags):
+            if flag not in bits:
+                bits[flag] = 1 << len(bits)
+    return bits
+
+
+# Registry of every flag available on the site, each with a unique bit used to compile settings into a bitmask.
+FLAG_BITS = _build_flag_bits()
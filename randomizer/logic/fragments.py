@@ -0,0 +1,133 @@
+# Registry of patch fragments that only depend on a few flags or world fields, so they can be built once per process
+# and reused for every seed instead of being rebuilt each time.
+
+import copy
+import functools
+
+from randomizer.logic.patch import Patch
+
+# All registered fragments, in the order they were declared.
+FRAGMENTS = []
+
+
+class Fragment:
+    """A piece of patch data built by a function of the game world that only reads the flags and world fields it
+    declares.  The result is cached per combination of those values.  Each world gets its own copy of it, so changing
+    the result in place can't leak into other seeds: patch data is frozen to bytes when it's cached, patches are
+    copied (sharing the frozen data), and anything else is deep copied.
+    """
+
+    def __init__(self, build, flags=(), fields=()):
+        """
+        Args:
+            build (function): Function taking the game world, plus any extra hashable arguments, that builds the
+                fragment.  Usually returns a Patch.
+            flags (list[type]): Flags the fragment depends on.
+            fields (list[str]): Names of world attributes the fragment depends on.  Values must be hashable.
+
+        """
+        self.build = build
+        self.flags = tuple(flags)
+        self.fields = tuple(fields)
+        self._cache = {}
+        functools.update_wrapper(self, build)
+
+    def key(self, world, *args):
+        """
+        Args:
+            world (randomizer.logic.main.GameWorld): Game world.
+            *args: Extra arguments for the build function.
+
+        Returns:
+            tuple: Cache key for the values this fragment depends on.
+
+        """
+        return (
+            tuple(world.settings.is_flag_enabled(flag) for flag in self.flags),
+            tuple(getattr(world, field) for field in self.fields),
+            args,
+        )
+
+    def __call__(self, world, *args):
+        """Get the fragment for this world, building it if this combination of dependencies hasn't been seen yet.
+
+        Args:
+            world (randomizer.logic.main.GameWorld): Game world.
+            *args: Extra arguments for the build function.
+
+        Returns:
+            randomizer.logic.patch.Patch: Copy of the cached fragment, or whatever else the build function returns.
+
+        """
+        key = self.key(world, *args)
+        try:
+            value = self._cache[key]
+        except KeyError:
+            value = self._cache[key] = _freeze(self.build(world, *args))
+        return _copy(value)
+
+    def clear(self):
+        """Forget all cached values for this fragment."""
+        self._cache.clear()
+
+
+def _freeze(value):
+    """
+    Args:
+        value: Value returned by a fragment build function.
+
+    Returns:
+        Value to cache, with the data in patches converted to bytes so it can't be changed in place.
+
+    """
+    if isinstance(value, Patch):
+        frozen = Patch()
+        for addr in value.addresses:
+            data = value.get_data(addr)
+            frozen.add_data(addr, data if isinstance(data, (bytes, int)) else bytes(data))
+        return frozen
+    elif isinstance(value, tuple):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _copy(value):
+    """
+    Args:
+        value: Cached fragment value from _freeze.
+
+    Returns:
+        Copy of the value for one world.  Patches are copied without copying their frozen data.
+
+    """
+    if isinstance(value, Patch):
+        patch = Patch()
+        patch += value
+        return patch
+    elif isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return copy.deepcopy(value)
+
+
+def fragment(flags=(), fields=()):
+    """Decorator to register a function as a cached patch fragment.
+
+    Args:
+        flags (list[type]): Flags the fragment depends on.
+        fields (list[str]): Names of world attributes the fragment depends on.
+
+    Returns:
+        function: Decorator returning the Fragment.
+
+    """
+    def decorator(build):
+        f = Fragment(build, flags, fields)
+        FRAGMENTS.append(f)
+        return f
+    return decorator
+
+
+def clear_fragments():
+    """Forget cached values for all fragments, e.g. after changing data they're built from during development."""
+    for f in FRAGMENTS:
+        f.clear()
@@ -0,0 +1,136 @@
+# Allocator for free space in the ROM, used to place text and scripts that are pointed to from a table.
+
+import bisect
+
+
+class FreeSpace:
+    """Free regions of the ROM to allocate data in.  Allocation is best fit: the smallest free region the data fits
+    in, taking the one that was freed first if there's a tie.  Regions can't cross a bank boundary, because the data is
+    referenced with two byte pointers within the bank.
+    """
+
+    def __init__(self, regions=None):
+        """
+        Args:
+            regions (dict[int, int]): Starting address and size of each free region, in order.
+
+        """
+        # Sorted (size, order, address) for each free region, so best fit is a binary search.
+        self._free = []
+        self._order = 0
+
+        # Total bytes registered and allocated in each bank, for the usage report.
+        self._total = {}
+        self._used = {}
+
+        for address, size in (regions or {}).items():
+            self.add(address, size)
+
+    def add(self, address, size):
+        """Register a free region.
+
+        Args:
+            address (int): Starting address.
+            size (int): Size in bytes.
+
+        """
+        if size < 0:
+            raise ValueError("Free region at {:#x} has negative size {}".format(address, size))
+        if size and (address >> 16) != ((address + size - 1) >> 16):
+            raise ValueError("Free region at {:#x} with size {} crosses a bank boundary".format(address, size))
+        for other_size, _, other in self._free:
+            if address < other + other_size and other < address + size:
+                raise ValueError("Free region at {:#x} overlaps region at {:#x}".format(address, other))
+
+        bank = address >> 16
+        self._total[bank] = self._total.get(bank, 0) + size
+        self._used.setdefault(bank, 0)
+        self._insert(address, size)
+
+    def _insert(self, address, size):
+        # Empty regions can never be allocated from, so there's no need to track them.
+        if size:
+            bisect.insort(self._free, (size, self._order, address))
+            self._order += 1
+
+    def allocate(self, length):
+        """Allocate space for data.
+
+        Args:
+            length (int): Size of the data in bytes.
+
+        Returns:
+            int|None: Address the data goes at, or None if there's no region big enough.
+
+        """
+        i = bisect.bisect_left(self._free, (length, -1, -1))
+        if i == len(self._free):
+            return None
+
+        size, _, address = self._free.pop(i)
+        self._insert(address + length, size - length)
+        self._used[address >> 16] += length
+        return address
+
+    def allocate_all(self, lengths):
+        """Allocate space for a batch of data, in order.  If it doesn't all fit that way, try again with a packing pass
+        that places the largest data first, which fits more when regions are tight.
+
+        Args:
+            lengths (list[int]): Size of each piece of data in bytes.
+
+        Returns:
+            list[int]|None: Address for each piece of data, or None if they can't all fit.  Nothing is allocated if
+                they don't fit.
+
+        """
+        state = (list(self._free), self._order, dict(self._used))
+
+        addresses = [self.allocate(length) for length in lengths]
+        if None not in addresses:
+            return addresses
+
+        self._free, self._order, self._used = list(state[0]), state[1], dict(state[2])
+        addresses = [None] * len(lengths)
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+            addresses[i] = self.allocate(lengths[i])
+            if addresses[i] is None:
+                self._free, self._order, self._used = state
+                return None
+        return addresses
+
+    def largest(self):
+        """
+        Returns:
+            int: Size of the largest free region, or 0 if there's no free space left.
+
+        """
+        return self._free[-1][0] if self._free else 0
+
+    def report(self):
+        """Usage of the registered space in each bank.
+
+        Returns:
+            list[dict]: Bank number, total/used/free bytes, number and size of the largest free region, and
+                fragmentation (the fraction of free space outside the largest region) for each bank.
+
+        """
+        free = {}
+        for size, _, address in self._free:
+            free.setdefault(address >> 16, []).append(size)
+
+        report = []
+        for bank in sorted(self._total):
+            sizes = free.get(bank, [])
+            free_bytes = sum(sizes)
+            largest = max(sizes, default=0)
+            report.append({
+                'bank': bank,
+                'total': self._total[bank],
+                'used': self._used[bank],
+                'free': free_bytes,
+                'regions': len(sizes),
+                'largest': largest,
+                'fragmentation': 1 - largest / free_bytes if free_bytes else 0.0,
+            })
+        return report
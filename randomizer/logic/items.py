@@ -227,6 +227,91 @@ def _randomize_item(item):
                     item.status_buffs.append(i)
 
 
+class ItemCatalog:
+    """Indexed view of the world's items for shop shuffling.  Sets of items are represented as integer bitmasks keyed
+    by item index, so shop eligibility checks become bitwise operations instead of rescanning the whole item list for
+    every shop slot.  Decoding a mask always returns items in ascending index order, which is the same order as
+    world.items, so random draws over the decoded lists are unchanged.
+
+    This must be built after item tiers are final, since the tier buckets are computed once on creation.
+    """
+
+    def __init__(self, world):
+        """
+        Args:
+            world (randomizer.logic.main.GameWorld):
+        """
+        self._items_by_index = dict((item.index, item) for item in world.items)
+
+        # Precomputed attribute sets.
+        self.all = self.mask(world.items)
+        self.vanilla_shop = self.mask(i for i in world.items if i.vanilla_shop)
+        self.reuseable = self.mask(i for i in world.items if i.reuseable)
+
+        # Per-tier buckets.
+        self.tiers = {}
+        for item in world.items:
+            self.tiers[item.hard_tier] = self.tiers.get(item.hard_tier, 0) | self.bit(item)
+
+        # Per-shop eligibility sets.
+        self.allowed = {}
+        for shop in world.shops:
+            self.allowed[shop.index] = self.mask(i for i in world.items if shop.is_item_allowed(i))
+
+    @staticmethod
+    def bit(item):
+        """
+        Args:
+            item (randomizer.data.items.Item): Item to get bit for.
+
+        Returns:
+            int: Bitmask with only this item set.
+        """
+        return 1 << item.index
+
+    def mask(self, items):
+        """
+        Args:
+            items: Iterable of items.
+
+        Returns:
+            int: Bitmask with each of the given items set.
+        """
+        result = 0
+        for item in items:
+            result |= self.bit(item)
+        return result
+
+    def tier_mask(self, predicate):
+        """
+        Args:
+            predicate: Function taking a hard tier value and returning True if the tier should be included.
+
+        Returns:
+            int: Bitmask of all items whose hard tier matches the predicate.
+        """
+        result = 0
+        for tier, bucket in self.tiers.items():
+            if predicate(tier):
+                result |= bucket
+        return result
+
+    def items_in(self, mask):
+        """
+        Args:
+            mask (int): Bitmask of items.
+
+        Returns:
+            list[randomizer.data.items.Item]: Items in the mask, in ascending index order.
+        """
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self._items_by_index[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+
 def randomize_all(world):
     """Randomize everything for items for a single seed.
 
@@ -411,18 +496,19 @@ def randomize_all(world):
     ranks.sort(key=lambda x: x.rank_value, reverse=True)
     ranks_reverse = sorted(ranks, key=lambda x: x.rank_value)
 
-    for item in world.items:
-        if item.is_equipment:
-            item.rank_order = (ranks.index(item) + 1 if item in ranks else 0)
-            item.rank_order_reverse = (ranks_reverse.index(item) + 1 if item in ranks_reverse else 0)
-            if item.rank_order <= 15:
-                item.hard_tier = 4
-            elif item.rank_order <= 35:
-                item.hard_tier = 3
-            elif item.rank_order <= 55:
-                item.hard_tier = 2
-            else:
-                item.hard_tier = 1
+    for position, item in enumerate(ranks_reverse, 1):
+        item.rank_order_reverse = position
+
+    for position, item in enumerate(ranks, 1):
+        item.rank_order = position
+        if item.rank_order <= 15:
+            item.hard_tier = 4
+        elif item.rank_order <= 35:
+            item.hard_tier = 3
+        elif item.rank_order <= 55:
+            item.hard_tier = 2
+        else:
+            item.hard_tier = 1
 
     # Useful debug function to print equipment property table.
     """
@@ -480,87 +566,74 @@ def randomize_all(world):
 
             done_already = set()
 
-            # Function determining what can go in a shop, based on flags selected
-            def get_valid_items(base, shop, exclude=None):
-                if exclude is None:
-                    exclude = []
-                valid_items = []
+            # Build the item catalog now that tiers are final, so shop eligibility can be checked with set operations.
+            world.item_catalog = catalog = ItemCatalog(world)
+            up_to_tier = catalog.tier_mask(lambda t: t <= tiers_allowed)
+            if tiers_allowed <= 2:
+                open_tier = catalog.tier_mask(lambda t: t == 1)
+            else:
+                open_tier = catalog.tier_mask(lambda t: t <= 2)
+            if tiers_allowed <= 3:
+                locked_tier = catalog.tier_mask(lambda t: t == tiers_allowed)
+            else:
+                locked_tier = catalog.tier_mask(lambda t: 2 < t <= 4)
+
+            # Function determining what can go in a shop, based on flags selected.  Returns a tuple of the static set
+            # of allowed items, and whether the exclude list and already done items should be removed from that set.
+            def get_shop_rule(shop):
+                allowed = catalog.allowed[shop.index]
+                open_shop = (shop.index in [0, 1, 2, 4, 5, 7, 17, 20, 21] or
+                             (shop.index == 22 and world.settings.is_flag_enabled(flags.BowsersKeepOpen)))
+                locked_shop = (shop.index in [12, 13, 14, 15, 16, 18, 19, 23, 24] or
+                               (shop.index == 22 and not world.settings.is_flag_enabled(flags.BowsersKeepOpen)))
+                missable_shop = allowed & up_to_tier & ~catalog.reuseable
 
                 # Sb and Sv - obsolete
                 if (world.settings.is_flag_enabled(flags.ShopShuffleBalanced) and
                         world.settings.is_flag_enabled(flags.ShopShuffleVanilla) and
                         not world.settings.is_flag_enabled(flags.ShopTier1)):
-                    # Open shops
-                    if (shop.index in [0, 1, 2, 4, 5, 7, 17, 20, 21] or
-                            (shop.index == 22 and world.settings.is_flag_enabled(flags.BowsersKeepOpen))):
-                        valid_items = [i for i in base if i not in done_already and i.vanilla_shop and
-                                       i not in exclude and shop.is_item_allowed(i) and
-                                       (((tiers_allowed == 1 or tiers_allowed == 2) and i.hard_tier == 1) or
-                                        ((tiers_allowed == 3 or tiers_allowed == 4) and i.hard_tier <= 2))]
-                        # In case the equip shuffle logic works out so that nothing belongs in a tiered shop,
-                        # pick any item of the appropriate class, ignoring tier
-                        # if not valid_items:
-                        #     valid_items = [i for i in base if i not in done_already and i.vanilla_shop and
-                        #                    i not in exclude and shop.is_item_allowed(i)]
-                    # Locked shops
-                    elif (shop.index in [12, 13, 14, 15, 16, 18, 19, 23, 24] or
-                          (shop.index == 22 and not world.settings.is_flag_enabled(flags.BowsersKeepOpen))):
-                        valid_items = [i for i in base if i not in done_already and i.vanilla_shop and
-                                       shop.is_item_allowed(i) and
-                                       ((3 >= tiers_allowed == i.hard_tier) or
-                                        (tiers_allowed == 4 and 2 < i.hard_tier <= 4))]
-                        # if not valid_items:
-                        #     valid_items = [i for i in base if i not in done_already and i.vanilla_shop and
-                        #                    i not in exclude and shop.is_item_allowed(i)]
-                    # Missable shop
+                    if open_shop:
+                        return allowed & catalog.vanilla_shop & open_tier, True, True
+                    elif locked_shop:
+                        return allowed & catalog.vanilla_shop & locked_tier, False, True
                     elif shop.index == 8:
-                        valid_items = [i for i in base if shop.is_item_allowed(i) and i.vanilla_shop and
-                                       i not in exclude and i.hard_tier <= tiers_allowed and not i.reuseable]
+                        return missable_shop & catalog.vanilla_shop, True, False
                 # Sv only
                 elif world.settings.is_flag_enabled(flags.ShopShuffleVanilla):
                     if shop.index == 8:
-                        valid_items = [i for i in base if shop.is_item_allowed(i) and i.vanilla_shop and
-                                       i not in exclude and i.hard_tier <= tiers_allowed and not i.reuseable]
+                        return missable_shop & catalog.vanilla_shop, True, False
                     else:
-                        valid_items = [i for i in base if i not in done_already and shop.is_item_allowed(i) and
-                                       i.vanilla_shop and i not in exclude and i.hard_tier <= tiers_allowed]
-
+                        return allowed & catalog.vanilla_shop & up_to_tier, True, True
                 # Sb only
                 elif (world.settings.is_flag_enabled(flags.ShopShuffleBalanced) and
                       not world.settings.is_flag_enabled(flags.ShopTier1)):
-                    # Open shops
-                    if (shop.index in [0, 1, 2, 4, 5, 7, 17, 20, 21] or
-                            (shop.index == 22 and world.settings.is_flag_enabled(flags.BowsersKeepOpen))):
-                        valid_items = [i for i in base if i not in done_already and i not in exclude and
-                                       shop.is_item_allowed(i) and
-                                       (((tiers_allowed == 1 or tiers_allowed == 2) and i.hard_tier == 1) or
-                                        ((tiers_allowed == 3 or tiers_allowed == 4) and i.hard_tier <= 2))]
-                        # if not valid_items:
-                        #     valid_items = [i for i in base if i not in done_already and i not in exclude and
-                        #                    i.vanilla_shop and shop.is_item_allowed(i)]
-                    # Locked shops
-                    elif (shop.index in [12, 13, 14, 15, 16, 18, 19, 23, 24] or
-                          (shop.index == 22 and not world.settings.is_flag_enabled(flags.BowsersKeepOpen))):
-                        valid_items = [i for i in base if i not in done_already and i not in exclude and
-                                       shop.is_item_allowed(i) and
-                                       ((3 >= tiers_allowed == i.hard_tier) or
-                                        (tiers_allowed == 4 and 2 < i.hard_tier <= 4))]
-                        # if not valid_items:
-                        #     valid_items = [i for i in base if i not in done_already and i not in exclude and
-                        #                    i.vanilla_shop and shop.is_item_allowed(i)]
-                    # Missable shop
+                    if open_shop:
+                        return allowed & open_tier, True, True
+                    elif locked_shop:
+                        return allowed & locked_tier, True, True
                     elif shop.index == 8:
-                        valid_items = [i for i in base if shop.is_item_allowed(i) and i not in exclude and
-                                       i.hard_tier <= tiers_allowed and not i.reuseable]
+                        return missable_shop, True, False
                 # Neither Sb nor Sv
                 else:
                     if shop.index == 8:
-                        valid_items = [i for i in base if shop.is_item_allowed(i) and i not in exclude and
-                                       i.hard_tier <= tiers_allowed and not i.reuseable]
+                        return missable_shop, True, False
                     else:
-                        valid_items = [i for i in base if i not in done_already and i not in exclude and
-                                       shop.is_item_allowed(i) and i.hard_tier <= tiers_allowed]
-                return valid_items
+                        return allowed & up_to_tier, True, True
+                return 0, False, False
+
+            shop_rules = dict((shop.index, get_shop_rule(shop)) for shop in world.shops)
+
+            def get_valid_mask(base, shop, exclude=None):
+                allowed, check_exclude, check_done = shop_rules[shop.index]
+                mask = base & allowed
+                if check_exclude and exclude:
+                    mask &= ~catalog.mask(exclude)
+                if check_done and done_already:
+                    mask &= ~catalog.mask(done_already)
+                return mask
+
+            def get_valid_items(base, shop, exclude=None):
+                return catalog.items_in(get_valid_mask(base, shop, exclude))
 
             # Do juice bar before frog coin shops. Frog coin shops dont leave enough items for juice bar in Sv1.
 
@@ -571,7 +644,7 @@ def randomize_all(world):
                     jpshop = shop1
             # pick full juice bar
             assignments[12] = []
-            possible_jb3 = get_valid_items(world.items, jpshop)
+            possible_jb3 = get_valid_items(catalog.all, jpshop)
             partial4 = random.sample(possible_jb3, random.randint(4, min(len(possible_jb3), 15)))
             for item in partial4:
                 assignments[12].append(item)
@@ -662,15 +735,17 @@ def randomize_all(world):
             # But we need a backup reserve of items to pull from in case the logic doesnt work out
             # i.e. Sb is enabled but there are no accessories in the upper tiers
             item_reserve = shop_items
+            reserve_mask = catalog.mask(item_reserve)
 
             # Unique items will first be split among the shops (anything except basic healing items)
             unique_items = [i for i in shop_items if not (i.consumable and not i.reuseable and i.basic)]
             basic_items = [i for i in shop_items if (i.consumable and not i.reuseable and i.basic)]
+            unique_mask = catalog.mask(unique_items)
 
             # Randomly assign anything to Yaridovich shop
             for shop in world.shops:
                 if shop.index == 8:
-                    valid_items = get_valid_items(item_reserve, shop)
+                    valid_items = get_valid_items(reserve_mask, shop)
                     yarid_items = random.sample(valid_items, random.randint(1, min(len(valid_items), 15)))
                     for item in yarid_items:
                         assignments[shop.index].append(item)
@@ -685,7 +760,8 @@ def randomize_all(world):
                 # Assign each item to one shop by default
                 for item in item_reserve:
                     if item not in assignments[12]:
-                        eligible_shops = [s for s in world.shops if len(assignments[s.index]) < 15 and s.index not in [3, 6, 8, 9, 10, 11, 12] and item in get_valid_items(item_reserve, s, assignments[s.index])]
+                        item_bit = catalog.bit(item)
+                        eligible_shops = [s for s in world.shops if len(assignments[s.index]) < 15 and s.index not in [3, 6, 8, 9, 10, 11, 12] and item_bit & get_valid_mask(reserve_mask, s, assignments[s.index])]
                         if eligible_shops:
                             shop = random.choice(eligible_shops)
                             if item not in assignments[shop.index]:
@@ -697,7 +773,7 @@ def randomize_all(world):
             for shop in world.shops:
                 if shop.index not in [3, 6, 8, 9, 10, 11, 12]:
                     if len(assignments[shop.index]) < 15:
-                        valid_items = get_valid_items(unique_items, shop, assignments[shop.index])
+                        valid_items = get_valid_items(unique_mask, shop, assignments[shop.index])
                         if valid_items:
                             max_remaining = min(15 - len(assignments[shop.index]), len(valid_items))
                             if max_remaining > 0:
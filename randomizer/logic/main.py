@@ -1,6 +1,7 @@
 # Main randomizer logic module that the front end calls.
 
 import collections
+import functools
 import hashlib
 import random
 import re
@@ -23,14 +24,20 @@ from . import keys
 from . import map
 from . import spells
 from . import utils
+from .fragments import fragment
 from .patch import Patch
 from .battleassembler import assemble_battle_scripts
 
 # Current version number
-VERSION = '8.2.7'
+VERSION = '8.2.8'
 
 
 class Settings:
+    """Flag settings for a seed.  The flags are compiled once on creation into a bitmask of enabled flags, along with
+    the canonical flag string and the selected choice for each flag.  Settings don't change after creation, so the same
+    instance can safely be shared between game worlds (see get_settings).
+    """
+
     def __init__(self, mode, debug_mode=False, flag_string=''):
         """Provide either form data fields or flag string to set flags on creation.
 
@@ -41,7 +48,7 @@ class Settings:
         """
         self._mode = mode
         self._debug_mode = debug_mode
-        self._enabled_flags = set()
+        self._enabled_flags = 0
 
         # If flag string provided, make fake form data based on it to parse.
         flag_data = {}
@@ -60,6 +67,13 @@ class Settings:
             for flag in category.flags:
                 self._check_flag_from_form_data(flag, flag_data)
 
+        # Compile the canonical flag string and selected choices now that the enabled flags are final.
+        self._flag_string = self._build_flag_string()
+        self._flag_choices = {}
+        for flag in flags.FLAG_BITS:
+            if flag.choices:
+                self._flag_choices[flag] = self._find_flag_choice(flag)
+
         # Sanity check.
         if debug_mode:
             provided_parts = set(flag_string.strip().split())
@@ -80,12 +94,12 @@ class Settings:
             if flag.value.startswith('-'):
                 # Solo flag that begins with a dash.
                 if flag_data.get(flag.value):
-                    self._enabled_flags.add(flag)
+                    self._enabled_flags |= flags.FLAG_BITS[flag]
             else:
                 # Flag that may be on its own with choices and/or suboptions.
                 if flag.value.startswith('@'):
                     if flag.value[1] in flag_data:
-                        self._enabled_flags.add(flag)
+                        self._enabled_flags |= flags.FLAG_BITS[flag]
                 else:
                     char = flag.value[0]
                     rest = flag.value[1:]
@@ -93,9 +107,9 @@ class Settings:
                     # Single character flag, just check if it's enabled.  Otherwise, make sure the small char is there.
                     if rest:
                         if rest in flag_data.get(char, []):
-                            self._enabled_flags.add(flag)
+                            self._enabled_flags |= flags.FLAG_BITS[flag]
                     elif char in flag_data:
-                        self._enabled_flags.add(flag)
+                        self._enabled_flags |= flags.FLAG_BITS[flag]
 
             # If flag was enabled, check choices/options recursively.
             if self.is_flag_enabled(flag):
@@ -151,8 +165,7 @@ class Settings:
                 for option in flag.options:
                     self._build_flag_string_part(option, flag_strings)
 
-    @property
-    def flag_string(self):
+    def _build_flag_string(self):
         """
         Returns:
             str: Computed flag string for these settings.
@@ -174,6 +187,14 @@ class Settings:
 
         return flag_string.strip()
 
+    @property
+    def flag_string(self):
+        """
+        Returns:
+            str: Canonical flag string for these settings.
+        """
+        return self._flag_string
+
     def is_flag_enabled(self, flag):
         """
         Args:
@@ -182,12 +203,12 @@ class Settings:
         Returns:
             bool: True if flag is enabled, False otherwise.
         """
-        return flag in self._enabled_flags
+        return bool(self._enabled_flags & flags.FLAG_BITS.get(flag, 0))
 
-    def get_flag_choice(self, flag):
+    def _find_flag_choice(self, flag):
         """
         Args:
-            flag: Flag class to get choice for.
+            flag: Flag class to find choice for.
 
         Returns:
             randomizer.logic.flags.Flag: Selected choice for this flag.
@@ -197,6 +218,175 @@ class Settings:
                 return choice
         return None
 
+    def get_flag_choice(self, flag):
+        """
+        Args:
+            flag: Flag class to get choice for.
+
+        Returns:
+            randomizer.logic.flags.Flag: Selected choice for this flag.
+        """
+        try:
+            return self._flag_choices[flag]
+        except KeyError:
+            return self._find_flag_choice(flag)
+
+
+@functools.lru_cache(maxsize=256)
+def get_settings(mode, debug_mode=False, flag_string=''):
+    """Get compiled settings for the given mode and flag string.  Settings are interned, so repeated requests with the
+    same flags share one instance and skip parsing the flag string again.
+
+    Args:
+        mode (str): Should be standard or open.
+        debug_mode (bool): Debug flag.
+        flag_string (str): Flag string to parse.
+
+    Returns:
+        Settings: Settings for these flags.
+    """
+    return Settings(mode, debug_mode, flag_string)
+
+
+# Randomization phases in the order they run, with the logic module for each.  Order matters for determinism!
+RANDOMIZE_PHASES = (
+    ('characters', characters),
+    ('spells', spells),
+    ('items', items),
+    ('enemies', enemies),
+    ('bosses', bosses),
+    ('keys', keys),
+    ('chests', chests),
+    ('games', games),
+    ('dialogs', dialogs),
+)
+
+
+def get_hash(seed, mode, flag_string, version=VERSION):
+    """Build the hash value that identifies a seed, used for the database and for choosing file select names.
+
+    Args:
+        seed (int): Seed number.
+        mode (str): Should be standard or open.
+        flag_string (str): Canonical flag string.
+        version (str): Logic version the seed was generated with.
+
+    Returns:
+        str: Hash value.
+    """
+    final_seed = bytearray()
+    final_seed += version.encode('utf-8')
+    final_seed += seed.to_bytes(4, 'big')
+    final_seed += mode.encode('utf-8')
+    final_seed += flag_string.encode('utf-8')
+    return hashlib.md5(final_seed).hexdigest()
+
+
+def get_phase_seed(seed, phase):
+    """Derive the seed for the random number stream of one randomization phase.  Each phase draws from its own stream,
+    so changing what one phase does (or which flags it looks at) doesn't reshuffle the results of the phases after it.
+
+    Args:
+        seed (int): Seed number.
+        phase (str): Name of the phase from RANDOMIZE_PHASES, or 'patch' for building the patch.
+
+    Returns:
+        int: Seed for the phase.
+    """
+    digest = hashlib.md5('{}:{}'.format(seed, phase).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+@fragment(flags=[flags.EnemySpells])
+def _patch_enemy_spell_animations(world):
+    """Fix animation lag for spells that are ignored when returning world.spells, when randomized spells is turned on.
+
+    Args:
+        world (GameWorld): Game world.
+
+    Returns:
+        randomizer.logic.patch.Patch: Patch data.
+    """
+    patch = Patch()
+    if world.settings.is_flag_enabled(flags.EnemySpells):
+        patch.add_data(0x351415, [0x0a, 0x0a, 0x0a])
+        patch.add_data(0x35142d, 0x0a)
+        patch.add_data(0x35142f, [0x0a, 0x0a, 0x0a])
+        patch.add_data(0x351449, 0x0a)
+        patch.add_data(0x35144b, [0x0a, 0x0a, 0x0a])
+        patch.add_data(0x351465, 0x0a)
+        patch.add_data(0x351467, [0x0a, 0x0a, 0x0a])
+        patch.add_data(0x351481, 0x0a)
+    return patch
+
+
+@fragment(flags=[flags.NoMackSkip])
+def _patch_no_mack_skip(world):
+    """
+    Args:
+        world (GameWorld): Game world.
+
+    Returns:
+        randomizer.logic.patch.Patch: Patch data.
+    """
+    patch = Patch()
+    if world.settings.is_flag_enabled(flags.NoMackSkip):
+        patch.add_data(0x14ca6c, bytes([0xA5]))
+    return patch
+
+
+@fragment(flags=[flags.CasinoWarp, flags.SevenStarHunt])
+def _patch_casino_warp(world):
+    """Events and dialog for the factory warp.
+
+    Args:
+        world (GameWorld): Game world.
+
+    Returns:
+        randomizer.logic.patch.Patch: Patch data.
+    """
+    patch = Patch()
+    if world.settings.is_flag_enabled(flags.CasinoWarp):
+        # patch the event jump
+        # event 2637
+
+        # star piece event check
+        # sometimes lazy shell can cause some weirdness with addresses, but we know this event began at 0x1FF451
+        # and our custom code should start +3 after that
+
+        # if R7 is turned on, we want this to be a check for 7 star pieces, not 6
+
+        if world.settings.is_flag_enabled(flags.SevenStarHunt):
+            patch.add_data(0x1FF454, [0xE0, 0x35, 0x07, 0x5C, 0xF4])
+        else:
+            patch.add_data(0x1FF454, [0xE0, 0x35, 0x06, 0x5C, 0xF4])
+
+        patch.add_data(0x1FF459, [0xD2, 0x67, 0xF4, 0xD0, 0x48, 0x08])
+
+        original_event_address = 0x1FF467
+        start9_b_address = 0x1FF45F
+        i = start9_b_address
+        while i < original_event_address:
+            patch.add_data(i, 0x9B)
+            i += 1
+
+        # event 2120
+        patch.add_data(0x1F7A4D,
+                       [0x60, 0x80, 0xAB, 0xC0, 0x66, 0x58, 0x7A, 0xD2, 0x67, 0xF4, 0xFE, 0x74, 0xD0, 0xCF, 0x0E,
+                        0xFE])
+        original_end_address = 0x1F7A90
+        start9_b_address = 0x1F7A5D
+        i = start9_b_address
+        while i <= original_end_address:
+            patch.add_data(i, 0x9B)
+            i += 1
+
+        # Dialog
+        patch.add_data(0x23D3CE, [0x44, 0x6F, 0x0F, 0x20, 0x77, 0x61, 0x6E, 0x74, 0x11, 0x67, 0x6F, 0x11, 0x53,
+                                  0x6D, 0x69, 0x74, 0x68, 0x79, 0x3F, 0x02, 0x08, 0x07, 0x20, 0x28, 0x4E, 0x6F,
+                                  0x29, 0x01, 0x08, 0x07, 0x20, 0x28, 0x59, 0x65, 0x73, 0x29, 0x00])
+    return patch
+
 
 class GameWorld:
     """Master container class representing the entire game world to be randomized.  This class doesn't do much on its
@@ -218,6 +408,9 @@ class GameWorld:
         # Bundt palette swap flag.
         self.chocolate_cake = False
 
+        # Free space allocators used for the patch, by name, for checking how much room is left.
+        self.free_space = {}
+
         # *** Get vanilla data for randomizing.
         # Characters
         self.characters = data.characters.get_default_characters(self)
@@ -239,6 +432,9 @@ class GameWorld:
         # Shops
         self.shops = data.items.get_default_shops(self)
 
+        # Indexed item catalog for shop shuffling, built during item randomization once item tiers are final.
+        self.item_catalog = None
+
         # Enemies
         self.enemies = data.enemies.get_default_enemies(self)
         self.enemies_dict = dict([(e.index, e) for e in self.enemies])
@@ -320,40 +516,58 @@ class GameWorld:
         """
         return self.formation_packs_dict[index]
 
-    def randomize(self):
-        """Randomize this entire game world instance."""
-        # Seed the PRNG at the start.
-        random.seed(self.seed)
-
-        characters.randomize_all(self)
-        spells.randomize_all(self)
-        items.randomize_all(self)
-        enemies.randomize_all(self)
-        bosses.randomize_all(self)
-        keys.randomize_all(self)
-        chests.randomize_all(self)
-        games.randomize_all(self)
-        dialogs.randomize_all(self)
+    def randomize(self, progress=None, trace=None):
+        """Randomize this entire game world instance.
+
+        Args:
+            progress: Optional function called with the name of each phase before it runs.
+            trace (randomizer.logic.rngtrace.RandomTrace): Optional running trace to record random draws for each
+                phase in.
+
+        """
+        for _ in self.iter_randomize(progress, trace):
+            pass
 
         # Rebuild hash after randomization.
         self._rebuild_hash()
 
+    def iter_randomize(self, progress=None, trace=None):
+        """Run the randomization phases one at a time, so callers can look at the world in between and stop early.
+        The world is only complete (and ready for build_patch) if every phase runs; use randomize for that.
+
+        Args:
+            progress: Optional function called with the name of each phase before it runs.
+            trace (randomizer.logic.rngtrace.RandomTrace): Optional running trace to record random draws for each
+                phase in.
+
+        Yields:
+            str: Name of each phase after it runs.
+
+        """
+        for phase, module in RANDOMIZE_PHASES:
+            if progress is not None:
+                progress(phase)
+            # Seed the PRNG with this phase's own stream.
+            random.seed(get_phase_seed(self.seed, phase))
+            if trace is not None:
+                trace.phase(phase)
+            module.randomize_all(self)
+            yield phase
+
     def _rebuild_hash(self):
         """Build hash value for choosing file select character and file name hash.
         Use the same version, seed, mode, and flags used for the database hash.
         """
-        final_seed = bytearray()
-        final_seed += VERSION.encode('utf-8')
-        final_seed += self.seed.to_bytes(4, 'big')
-        final_seed += self.settings.mode.encode('utf-8')
-        final_seed += self.settings.flag_string.encode('utf-8')
-        self.hash = hashlib.md5(final_seed).hexdigest()
+        self.hash = get_hash(self.seed, self.settings.mode, self.settings.flag_string)
 
     def build_patch(self):
         """Build patch data for this instance.
 
         :rtype: randomizer.logic.patch.Patch
         """
+        # Some patch data is still chosen randomly, so it gets its own stream too.
+        random.seed(get_phase_seed(self.seed, 'patch'))
+
         patch = Patch()
 
         # Characters
@@ -569,16 +783,8 @@ class GameWorld:
         for spell in self.spells:
             patch += spell.get_patch()
 
-        #These spells are ignored when returning world.spells, so i'm applying the patch here to fix animation lag when randomized spells is turned on
-        if self.settings.is_flag_enabled(flags.EnemySpells):
-            patch.add_data(0x351415, [0x0a, 0x0a, 0x0a])
-            patch.add_data(0x35142d, 0x0a)
-            patch.add_data(0x35142f, [0x0a, 0x0a, 0x0a])
-            patch.add_data(0x351449, 0x0a)
-            patch.add_data(0x35144b, [0x0a, 0x0a, 0x0a])
-            patch.add_data(0x351465, 0x0a)
-            patch.add_data(0x351467, [0x0a, 0x0a, 0x0a])
-            patch.add_data(0x351481, 0x0a)
+        # Fix animation lag for spells that are ignored when returning world.spells.
+        patch += _patch_enemy_spell_animations(self)
 
         # Starting FP (twice for starting/max FP)
         patch.add_data(0x3a00dd, utils.ByteField(self.starting_fp).as_bytes() * 2)
@@ -589,8 +795,7 @@ class GameWorld:
             patch.add_data(0x3a00df, utils.ByteField(99, num_bytes=2).as_bytes())
 
         # No Mack Skip flag
-        if self.settings.is_flag_enabled(flags.NoMackSkip):
-            patch.add_data(0x14ca6c, bytes([0xA5]))
+        patch += _patch_no_mack_skip(self)
 
         # Items
         for item in self.items:
@@ -679,51 +884,13 @@ class GameWorld:
 
         # Unlock the whole map if in debug mode in standard.
         if self.debug_mode and not self.open_mode:
-            patch += map.unlock_world_map()
+            patch += map.unlock_world_map(self)
 
         # Bowser's Keep doors
         patch += doors.patch_bowser_doors(self)
 
         # factory warp
-        if self.settings.is_flag_enabled(flags.CasinoWarp):
-            # patch the event jump
-            # event 2637
-
-            # star piece event check
-            # sometimes lazy shell can cause some weirdness with addresses, but we know this event began at 0x1FF451
-            # and our custom code should start +3 after that
-
-            # if R7 is turned on, we want this to be a check for 7 star pieces, not 6
-
-            if self.settings.is_flag_enabled(flags.SevenStarHunt):
-                patch.add_data(0x1FF454, [0xE0, 0x35, 0x07, 0x5C, 0xF4])
-            else:
-                patch.add_data(0x1FF454, [0xE0, 0x35, 0x06, 0x5C, 0xF4])
-
-            patch.add_data(0x1FF459, [0xD2, 0x67, 0xF4, 0xD0, 0x48, 0x08])
-
-            original_event_address = 0x1FF467
-            start9_b_address = 0x1FF45F
-            i = start9_b_address
-            while i < original_event_address:
-                patch.add_data(i, 0x9B)
-                i += 1
-
-            # event 2120
-            patch.add_data(0x1F7A4D,
-                           [0x60, 0x80, 0xAB, 0xC0, 0x66, 0x58, 0x7A, 0xD2, 0x67, 0xF4, 0xFE, 0x74, 0xD0, 0xCF, 0x0E,
-                            0xFE])
-            original_end_address = 0x1F7A90
-            start9_b_address = 0x1F7A5D
-            i = start9_b_address
-            while i <= original_end_address:
-                patch.add_data(i, 0x9B)
-                i += 1
-
-            # Dialog
-            patch.add_data(0x23D3CE, [0x44, 0x6F, 0x0F, 0x20, 0x77, 0x61, 0x6E, 0x74, 0x11, 0x67, 0x6F, 0x11, 0x53,
-                                      0x6D, 0x69, 0x74, 0x68, 0x79, 0x3F, 0x02, 0x08, 0x07, 0x20, 0x28, 0x4E, 0x6F,
-                                      0x29, 0x01, 0x08, 0x07, 0x20, 0x28, 0x59, 0x65, 0x73, 0x29, 0x00])
+        patch += _patch_casino_warp(self)
 
         # Overworld boss sprites
         if self.open_mode:
@@ -1,5 +1,6 @@
 # Map randomization logic.
 
+from .fragments import fragment
 from .patch import Patch
 from .utils import ByteField
 
@@ -65,9 +66,12 @@ MAP_OBJECT_DATA = (
 )
 
 
-def unlock_world_map():
-    """Get patch data to unlock the entire world map for testing.
+@fragment()
+def unlock_world_map(world):
+    """Get patch data to unlock the entire world map for testing.  This is the same for every seed, so it's only built
+    once.
 
+    :type world: randomizer.logic.main.GameWorld
     :rtype: randomizer.logic.patch.Patch
     """
     base_address = 0x3ef830
@@ -0,0 +1,198 @@
+# Opt-in instrumentation of the random number stream during randomization, for checking that changes to the logic
+# don't change which random numbers get drawn.
+
+import collections
+import hashlib
+import os
+import random
+import sys
+
+# Module level random functions that get counted.  The logic modules all draw through these.
+TRACED_FUNCTIONS = ('randint', 'choice', 'choices', 'sample', 'shuffle', 'random')
+
+# Strip this from call site file names so reports are the same on different machines.
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class RandomTrace:
+    """Counts draws from the global random module and digests the raw values behind them, per phase.
+
+    Every call to one of TRACED_FUNCTIONS is recorded with its call site, and the raw generator output it consumed
+    (from getrandbits and random) is hashed into a digest for the draw and a rolling digest for the phase.  Two runs
+    with the same phase digests drew exactly the same random stream; if they differ, first_divergence finds the first
+    draw where they split.
+    """
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self._phase = None
+        self._draw = None
+        self._originals = {}
+
+    def start(self, phase=None):
+        """Start tracing the global random module.  Draws are only recorded once a phase has started.
+
+        Args:
+            phase (str): Name of the first phase, if any.
+
+        """
+        if self._originals:
+            raise RuntimeError("Random trace is already running")
+
+        inst = random._inst
+        for name in TRACED_FUNCTIONS:
+            self._originals[name] = getattr(random, name)
+            setattr(random, name, self._wrap(name))
+
+        # Hook the generator primitives on the shared instance, so everything the traced functions consume is seen.
+        # Instance attributes take priority over the class methods the Random internals look up through self.
+        raw_random = inst.random
+        raw_getrandbits = inst.getrandbits
+
+        def traced_random():
+            value = raw_random()
+            self._consume(value)
+            return value
+
+        def traced_getrandbits(k):
+            value = raw_getrandbits(k)
+            self._consume(value)
+            return value
+
+        inst.random = traced_random
+        inst.getrandbits = traced_getrandbits
+        if phase is not None:
+            self.phase(phase)
+
+    def stop(self):
+        """Stop tracing and restore the random module."""
+        inst = random._inst
+        inst.__dict__.pop('random', None)
+        inst.__dict__.pop('getrandbits', None)
+        for name, func in self._originals.items():
+            setattr(random, name, func)
+        self._originals = {}
+        self._phase = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def phase(self, name):
+        """Start counting draws for a new phase.
+
+        Args:
+            name (str): Phase name.
+
+        """
+        self._phase = {
+            'digest': hashlib.sha1(),
+            'counts': collections.Counter(),
+            'draws': [],
+        }
+        self.phases[name] = self._phase
+
+    def _wrap(self, name):
+        def traced(*args, **kwargs):
+            # Look the method up on each call, so random.random goes through the hooked primitive.
+            method = getattr(random._inst, name)
+
+            # Only count the outermost call if the logic ever nests these.
+            if self._draw is not None:
+                return method(*args, **kwargs)
+
+            frame = sys._getframe(1)
+            site = '{}:{} ({})'.format(os.path.relpath(frame.f_code.co_filename, _BASE_DIR), frame.f_lineno,
+                                       frame.f_code.co_name)
+            self._draw = hashlib.sha1(name.encode())
+            self._draw.update(_describe_args(args).encode())
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if self._phase is not None:
+                    self._phase['counts'][(name, site)] += 1
+                    self._phase['draws'].append((name, site, self._draw.hexdigest()[:12]))
+                self._draw = None
+
+        return traced
+
+    def _consume(self, value):
+        data = repr(value).encode()
+        if self._draw is not None:
+            self._draw.update(data)
+        if self._phase is not None:
+            self._phase['digest'].update(data)
+
+    def report(self):
+        """
+        Returns:
+            dict: For each phase in order, the number of draws, rolling digest of the raw values drawn, draw counts by
+                function and call site, and the list of draws.
+
+        """
+        report = collections.OrderedDict()
+        for name, phase in self.phases.items():
+            report[name] = {
+                'draws': len(phase['draws']),
+                'digest': phase['digest'].hexdigest(),
+                'counts': ['{} {}: {}'.format(func, site, count)
+                           for (func, site), count in sorted(phase['counts'].items())],
+                'sequence': [list(draw) for draw in phase['draws']],
+            }
+        return report
+
+
+def _describe_args(args):
+    """
+    Args:
+        args (tuple): Positional arguments to a random function.
+
+    Returns:
+        str: Description of the arguments that's stable between runs, so the same raw values drawn for different
+            arguments (e.g. a choice from a longer list) count as a different draw.
+
+    """
+    parts = []
+    for arg in args:
+        if isinstance(arg, (int, float)):
+            parts.append(repr(arg))
+        elif hasattr(arg, '__len__'):
+            parts.append('len={}'.format(len(arg)))
+        else:
+            parts.append(type(arg).__name__)
+    return ','.join(parts)
+
+
+def first_divergence(a, b):
+    """Find the first draw where two trace reports differ.  Draws are compared by function and values consumed, not
+    call site, since refactors move code around.
+
+    Args:
+        a (dict): Report from RandomTrace.report.
+        b (dict): Report to compare against.
+
+    Returns:
+        dict|None: Phase, draw index and the draw from each report (or None if one report ran out of draws) where the
+            streams first split, or None if they're identical.
+
+    """
+    for name in list(a) + [n for n in b if n not in a]:
+        phase_a = a.get(name, {'digest': None, 'sequence': []})
+        phase_b = b.get(name, {'digest': None, 'sequence': []})
+        if phase_a['digest'] == phase_b['digest'] and len(phase_a['sequence']) == len(phase_b['sequence']):
+            continue
+
+        seq_a, seq_b = phase_a['sequence'], phase_b['sequence']
+        for i in range(max(len(seq_a), len(seq_b))):
+            draw_a = seq_a[i] if i < len(seq_a) else None
+            draw_b = seq_b[i] if i < len(seq_b) else None
+            if draw_a is None or draw_b is None or (draw_a[0], draw_a[2]) != (draw_b[0], draw_b[2]):
+                return {'phase': name, 'index': i, 'a': draw_a, 'b': draw_b}
+
+        # Same draws, but the raw values differ outside of traced calls (e.g. a direct getrandbits).
+        return {'phase': name, 'index': None, 'a': None, 'b': None}
+
+    return None
@@ -0,0 +1,298 @@
+# Search for seeds with particular properties, e.g. for races.  Seeds are rejected as soon as the phase that decides a
+# property has run and it doesn't match, and the patch is never built, so this is much faster than generating full
+# seeds.
+
+import collections
+import inspect
+import multiprocessing
+import time
+
+from randomizer.data.bosses import BossLocation, StarLocation
+from . import flags
+from .main import GameWorld, RANDOMIZE_PHASES, get_settings
+
+# Seeds are 32 bit numbers.
+SEED_RANGE = 2 ** 32
+
+# Number of seeds each worker process checks per batch.
+BATCH_PER_WORKER = 64
+
+
+def _item_name(item):
+    """
+    Args:
+        item (randomizer.data.items.Item|type): Item instance or class at a location.
+
+    Returns:
+        str: Name of the item.
+
+    """
+    return item.__name__ if inspect.isclass(item) else item.name
+
+
+class Predicate:
+    """A property a seed must have.  Each predicate knows which phase decides it, so the search can check it as soon as
+    that phase has run.
+    """
+    # Phase after which this predicate can be checked.
+    phase = None
+
+    def __init__(self, text, negate=False):
+        """
+        Args:
+            text (str): Text the predicate was parsed from.
+            negate (bool): Seed must NOT have this property.
+
+        """
+        self.text = text
+        self.negate = negate
+
+    def __str__(self):
+        return self.text
+
+    def check(self, world):
+        """
+        Args:
+            world (randomizer.logic.main.GameWorld): World that has run at least up to this predicate's phase.
+
+        Returns:
+            bool: True if the world matches.
+
+        """
+        return self.test(world) != self.negate
+
+    def test(self, world):
+        raise NotImplementedError
+
+
+class StarPredicate(Predicate):
+    """Boss location has a star piece."""
+    phase = 'bosses'
+
+    def __init__(self, text, location, negate=False):
+        super().__init__(text, negate)
+        self.location = location
+
+    def test(self, world):
+        return any(l.name == self.location and l.has_star for l in world.boss_locations)
+
+
+class BossPredicate(Predicate):
+    """Boss location has a particular boss."""
+    phase = 'bosses'
+
+    def __init__(self, text, location, boss, negate=False):
+        super().__init__(text, negate)
+        self.location = location
+        self.boss = boss
+
+    def test(self, world):
+        return any(l.name == self.location and l.formation.bosses[0].name == self.boss for l in world.boss_locations)
+
+
+class ItemPredicate(Predicate):
+    """Item is at a particular location, or at any key item location or chest."""
+
+    def __init__(self, text, item, where, phase, negate=False):
+        super().__init__(text, negate)
+        self.item = item
+        self.where = where
+        self.phase = phase
+
+    def test(self, world):
+        if self.where == 'key':
+            locations = world.key_locations
+        elif self.where == 'chest':
+            locations = world.chest_locations
+        else:
+            locations = [l for l in world.key_locations + world.chest_locations if l.name == self.where]
+        return any(l.item is not None and _item_name(l.item) == self.item for l in locations)
+
+
+def parse_predicate(text, world):
+    """Parse a predicate from text.  Formats are:
+
+    * star:Location - Boss location has a star piece, e.g. star:Culex
+    * boss:Location=Boss - Boss location has this boss, e.g. boss:Mack=CzarDragon
+    * item:Item=Where - Item is at a key item location ("key"), in a chest ("chest"), or at a particular location, e.g.
+      item:Cymbals=chest
+
+    Prefix with ! to require the seed NOT to have the property.
+
+    Args:
+        text (str): Predicate text.
+        world (randomizer.logic.main.GameWorld): World with the settings being searched, to check names against.
+
+    Returns:
+        Predicate: Parsed predicate.
+
+    """
+    negate = text.startswith('!')
+    kind, _, rest = text.lstrip('!').partition(':')
+    target, _, value = rest.partition('=')
+
+    star_locations = {l.name for l in world.boss_locations if isinstance(l, StarLocation)}
+    boss_locations = {l.name for l in world.boss_locations if isinstance(l, BossLocation)}
+    bosses = {e.name for e in world.enemies}
+    items = {i.name for i in world.items}
+    key_locations = {l.name for l in world.key_locations}
+    chest_locations = {l.name for l in world.chest_locations}
+
+    if kind == 'star' and not value:
+        if target not in star_locations:
+            raise ValueError("Unknown star location {!r} in {!r}".format(target, text))
+        return StarPredicate(text, target, negate)
+
+    if kind == 'boss' and value:
+        if target not in boss_locations:
+            raise ValueError("Unknown boss location {!r} in {!r}".format(target, text))
+        if value not in bosses:
+            raise ValueError("Unknown boss {!r} in {!r}".format(value, text))
+        return BossPredicate(text, target, value, negate)
+
+    if kind == 'item' and value:
+        # Key items aren't in the item list, so also allow anything that starts out at a key item location.
+        if target not in items | {_item_name(l.item) for l in world.key_locations if l.item is not None}:
+            raise ValueError("Unknown item {!r} in {!r}".format(target, text))
+        if value == 'key' or value in key_locations - chest_locations:
+            # Key items are placed together with the chests if they can be in chests.
+            phase = 'chests' if world.settings.is_flag_enabled(flags.ChestIncludeKeyItems) else 'keys'
+        elif value == 'chest' or value in chest_locations:
+            phase = 'chests'
+        else:
+            raise ValueError("Unknown item location {!r} in {!r}".format(value, text))
+        return ItemPredicate(text, target, value, phase, negate)
+
+    raise ValueError("Can't parse predicate {!r}, expected star:Location, boss:Location=Boss or item:Item=Where".format(
+        text))
+
+
+def check_seed(seed, settings, predicates):
+    """Randomize a seed phase by phase, checking each predicate as soon as its phase has run and stopping at the first
+    one that fails.
+
+    Args:
+        seed (int): Seed number.
+        settings (randomizer.logic.main.Settings): Settings to generate with.
+        predicates (list[Predicate]): Properties the seed must have.
+
+    Returns:
+        tuple[bool, str]: Whether the seed matches, and the last phase that ran.  Phase is 'error' if generation
+            failed for this seed.
+
+    """
+    world = GameWorld(seed, settings)
+
+    try:
+        for phase in world.iter_randomize():
+            for predicate in predicates:
+                if predicate.phase == phase and not predicate.check(world):
+                    return False, phase
+        # Only matching seeds get here.  They run the rest of the phases anyway (but not build_patch), so a seed that
+        # can't actually be generated isn't returned.
+    except Exception:
+        # Some flag combinations can't be generated for every seed, so just skip those seeds.
+        return False, 'error'
+
+    # Later phases can still change what an earlier one decided, so check everything again on the finished world.
+    if not all(predicate.check(world) for predicate in predicates):
+        return False, phase
+
+    return True, phase
+
+
+# Settings and predicates for worker processes, set by _init_worker.
+_worker_args = None
+
+
+def _init_worker(mode, debug_mode, flag_string, predicate_texts):
+    global _worker_args
+    settings = get_settings(mode, debug_mode, flag_string)
+    world = GameWorld(0, settings)
+    _worker_args = (settings, [parse_predicate(text, world) for text in predicate_texts])
+
+
+def _check_worker(seed):
+    settings, predicates = _worker_args
+    return seed, check_seed(seed, settings, predicates)
+
+
+def search(mode, flag_string, predicate_texts, count=1, start=0, limit=None, workers=1, debug_mode=False,
+           progress=None):
+    """Find seeds that have all the given properties, checking seeds in order from the start seed.
+
+    Args:
+        mode (str): Should be standard or open.
+        flag_string (str): Flags to generate with.
+        predicate_texts (list[str]): Properties the seeds must have, see parse_predicate for the format.
+        count (int): Number of matching seeds to find.
+        start (int): First seed to check.
+        limit (int): Maximum number of seeds to check, or None for no limit.
+        workers (int): Number of processes to check seeds in.
+        debug_mode (bool): Debug flag.
+        progress: Optional function called with the stats after each batch of seeds.
+
+    Returns:
+        tuple[list[int], dict]: The first matching seeds after the start seed, in order, and stats for the search:
+            seeds checked, matches, generation errors, how many seeds were rejected after each phase, elapsed time
+            and seeds checked per second.
+
+    """
+    if not predicate_texts:
+        raise ValueError("Need at least one predicate to search for")
+
+    # Parse here first so bad predicates fail before starting any workers.
+    settings = get_settings(mode, debug_mode, flag_string)
+    world = GameWorld(0, settings)
+    predicates = [parse_predicate(text, world) for text in predicate_texts]
+
+    stats = {
+        'checked': 0,
+        'matched': 0,
+        'errors': 0,
+        'rejected': collections.OrderedDict((phase, 0) for phase, _ in RANDOMIZE_PHASES),
+        'elapsed': 0.0,
+        'per_second': 0.0,
+    }
+    matches = []
+    started = time.time()
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _init_worker, (mode, debug_mode, flag_string, list(predicate_texts)))
+
+    try:
+        batch_size = BATCH_PER_WORKER * max(workers, 1)
+        offset = 0
+        while len(matches) < count and (limit is None or offset < limit):
+            size = batch_size if limit is None else min(batch_size, limit - offset)
+            seeds = [(start + offset + i) % SEED_RANGE for i in range(size)]
+            offset += size
+
+            if pool is not None:
+                results = pool.map(_check_worker, seeds, chunksize=BATCH_PER_WORKER // 4)
+            else:
+                results = [(seed, check_seed(seed, settings, predicates)) for seed in seeds]
+
+            for seed, (matched, phase) in results:
+                stats['checked'] += 1
+                if matched:
+                    stats['matched'] += 1
+                    matches.append(seed)
+                    if len(matches) == count:
+                        break
+                elif phase == 'error':
+                    stats['errors'] += 1
+                else:
+                    stats['rejected'][phase] += 1
+
+            stats['elapsed'] = time.time() - started
+            stats['per_second'] = stats['checked'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if progress is not None:
+                progress(stats)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return matches, stats
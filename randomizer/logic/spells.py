@@ -53,7 +53,7 @@ def _randomize_spell_casting(world):
                 if not possible_spells:
                     possible_spells = [arg]
                 new_args.append(random.choice(possible_spells).index)
-            script[i] = command, new_args
+            enemy.set_script_command(i, (command, new_args))
 
 
 def randomize_all(world):
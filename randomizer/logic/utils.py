@@ -185,3 +185,163 @@ def split_camel_case(string):
 
     """
     return re.sub(r'(?!^)([A-Z0-9][a-z]*)', r' \1', string)
+
+
+class TokenEncoder:
+    """Encode text for one of the game's fonts with a table of tokens, where each token is written as one character.
+    Single character tokens are characters the font has something else in place of, and longer ones compress common
+    words.
+
+    Tokens are replaced one at a time in a fixed order, so each one is a single str.replace() call.  The order is picked
+    so that where two tokens overlap, the one that gives the shorter encoding wins.  That isn't enough when a token
+    overlaps others on both ends, like " I " in "  I  ", so those strings are spotted after replacing and encoded again
+    with a shortest path search over a trie of the tokens.
+    """
+
+    def __init__(self, table, order=None, terminator=''):
+        """
+        Args:
+            table (list[tuple[str, str]]): Each token and the character it's written as.
+            order (list[str]): Tokens in the order to replace them, if not the order of the table.  A token's character
+                can't be part of a token that's replaced after it.
+            terminator (str): Added to the end of encoded text, like a null byte for null terminated strings.
+
+        """
+        self.terminator = terminator
+        chars = dict(table)
+        if order is None:
+            order = [token for token, char in table]
+        self._replacements = [(token, chars[token]) for token in order]
+        self._decoding = {char: token for token, char in table}
+
+        # Single characters that have to be replaced, because the font has something else in their place.
+        self._required = {token for token, char in table if len(token) == 1}
+
+        self._trie = {}
+        for token, char in table:
+            node = self._trie
+            for c in token:
+                node = node.setdefault(c, {})
+            node[None] = char
+
+        # Tokens that other tokens can overlap on both ends, and the characters that can be next to them after replacing
+        # when that happens.  Runs of the same character overlap each other too, but replacing the longest run first
+        # already gives the shortest encoding for them.
+        multi = [token for token, char in table if len(token) > 1]
+        middles, before, after = set(), set(), set()
+        for token in multi:
+            if len(set(token)) == 1:
+                continue
+            left = {other[-k - 1] for other in multi for k in range(1, min(len(token), len(other)))
+                    if other.endswith(token[:k])}
+            right = {other[k] for other in multi for k in range(1, min(len(token), len(other)))
+                     if other.startswith(token[-k:])}
+            if left and right:
+                middles.add(chars[token])
+                before |= left
+                after |= right
+        before |= middles | {char for token, char in table if token[-1] in before}
+        after |= middles | {char for token, char in table if token[0] in after}
+        self._middles = sorted(middles)
+        self._overlap = re.compile('[{}](?<=[{}].)[{}]'.format(
+            *(re.escape(''.join(sorted(s))) for s in (middles, before, after)))) if middles else None
+
+    def encode(self, string):
+        """Encode text with the fewest characters possible.
+
+        Args:
+            string (str): Text to encode.
+
+        Returns:
+            str: Encoded text, with the terminator.
+
+        """
+        replace = str.replace
+        encoded = string
+        for token, char in self._replacements:
+            encoded = replace(encoded, token, char)
+
+        # Checking for the characters first is much cheaper than a regex search, and most strings don't have them.
+        for char in self._middles:
+            if char in encoded:
+                if self._overlap.search(encoded):
+                    return self.encode_shortest(string) + self.terminator
+                break
+        return encoded + self.terminator
+
+    def encode_shortest(self, string):
+        """Encode text with the fewest characters possible, by working backwards from the end of the string and taking
+        the cheapest way to encode the rest from each position.  This is much slower than encode(), which only uses it
+        when replacing tokens in order might not give the shortest encoding.
+
+        Args:
+            string (str): Text to encode.
+
+        Returns:
+            str: Encoded text, without the terminator.
+
+        """
+        length = len(string)
+
+        # Cost to encode the rest of the string from each position, and the (length, character) of the first token.
+        cost = [0] * (length + 1)
+        choice = [None] * length
+        for i in range(length - 1, -1, -1):
+            best_cost = best = None
+            if string[i] not in self._required:
+                best_cost, best = cost[i + 1] + 1, (1, string[i])
+
+            # Walk the trie for every token starting here, preferring longer ones when the cost is the same.
+            node = self._trie
+            j = i
+            while j < length and string[j] in node:
+                node = node[string[j]]
+                j += 1
+                if None in node and (best_cost is None or cost[j] + 1 <= best_cost):
+                    best_cost, best = cost[j] + 1, (j - i, node[None])
+
+            cost[i] = best_cost
+            choice[i] = best
+
+        encoded = []
+        i = 0
+        while i < length:
+            token_length, char = choice[i]
+            encoded.append(char)
+            i += token_length
+        return ''.join(encoded)
+
+    def decode(self, string):
+        """
+        Args:
+            string (str): Encoded text, with or without the terminator.
+
+        Returns:
+            str: Text.
+
+        """
+        if self.terminator and string.endswith(self.terminator):
+            string = string[:-len(self.terminator)]
+        return ''.join(self._decoding.get(c, c) for c in string)
+
+
+def pool_strings(strings):
+    """Store a set of null terminated strings for a pointer table as compactly as possible.  Identical strings are only
+    stored once, and a string that's the end of another one points into it instead of getting its own copy.
+
+    Args:
+        strings (collections.abc.Iterable[bytes]): Strings to store, including the null terminator.
+
+    Returns:
+        tuple[list[bytes], dict[bytes, tuple[int, int]]]: Strings that need to be stored, and for each input string, the
+            index of the stored string it's part of and its offset in it.
+
+    """
+    # Sorting by the reversed strings puts each string right after the longer strings it's the end of.
+    stored = []
+    locations = {}
+    for string in sorted(set(strings), key=lambda s: s[::-1], reverse=True):
+        if not stored or not stored[-1].endswith(string):
+            stored.append(string)
+        locations[string] = (len(stored) - 1, len(stored[-1]) - len(string))
+    return stored, locations
@@ -1,21 +1,69 @@
+import datetime
+import time
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 
 from randomizer.logic.main import VERSION
-from randomizer.models import Seed
+from randomizer.models import Job, Seed, Patch
 
 
 class Command(BaseCommand):
     help = 'Remove old seeds that are from previous versions, or at least 6 months old.'
 
+    def add_arguments(self, parser):
+        """Add optional arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('--older-than', dest='older_than', default=180, type=int,
+                            help='Remove seeds generated at least this many days ago, regardless of version.  '
+                                 'Use 0 to only remove seeds from previous versions.  Default: %(default)s')
+
+        parser.add_argument('-b', '--batch-size', dest='batch_size', default=1000, type=int,
+                            help='Number of seeds to delete per transaction.  Default: %(default)s')
+
+        parser.add_argument('-s', '--sleep', dest='sleep', default=0.0, type=float,
+                            help='Seconds to pause between batches to limit load on a live database.  '
+                                 'Default: %(default)s')
+
+        parser.add_argument('-n', '--dry-run', dest='dry_run', action='store_true',
+                            help="Only count the seeds and patches that would be removed, don't delete anything.")
+
     def handle(self, *args, **options):
+        query = ~Q(version=VERSION)
+        if options['older_than'] > 0:
+            cutoff = timezone.now() - datetime.timedelta(days=options['older_than'])
+            query |= Q(generated__lt=cutoff)
+        old_seeds = Seed.objects.filter(query)
+
+        if options['dry_run']:
+            self.stdout.write("Would clear {} old seeds with {} patches".format(
+                old_seeds.count(), Patch.objects.filter(seed__in=old_seeds).count()))
+            return
+
+        # Delete in bounded batches, each in its own short transaction, so we never hold locks on a large part of the
+        # table.  Related patches and spoilers are removed by the cascade as one query per table per batch.
         count = 0
+        while True:
+            ids = list(old_seeds.order_by('generated').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
 
-        for seed in Seed.objects.filter(~Q(version=VERSION)):
             with transaction.atomic():
-                seed.patch_set.all().delete()
-                seed.delete()
-                count += 1
+                Seed.objects.filter(id__in=ids).delete()
+            count += len(ids)
+            self.stdout.write("Cleared {} old seeds".format(count), ending='\r')
+
+            if options['sleep'] > 0:
+                time.sleep(options['sleep'])
 
         self.stdout.write("Cleared {} old seeds".format(count))
+
+        # Finished generation jobs are only needed until the client picks up the result.
+        job_count, _ = Job.objects.filter(finished__lt=timezone.now() - datetime.timedelta(days=1)).delete()
+        self.stdout.write("Cleared {} finished jobs".format(job_count))
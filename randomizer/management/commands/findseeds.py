@@ -0,0 +1,72 @@
+import os
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from randomizer.logic.flags import FlagError
+from randomizer.logic.search import search
+
+
+class Command(BaseCommand):
+    help = 'Find seeds with particular boss, star piece or item placements, e.g. for races.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('-p', '--predicate', dest='predicates', action='append', required=True,
+                            help='Property the seed must have, can be given more than once: star:Location, '
+                                 'boss:Location=Boss or item:Item=key|chest|Location.  Prefix with ! to negate.')
+
+        parser.add_argument('-m', '--mode', dest='mode', default='open', choices=['linear', 'open'],
+                            help='Mode to generate.  Default: %(default)s')
+
+        parser.add_argument('-f', '--flags', dest='flags', default='',
+                            help='Flags string (from website).')
+
+        parser.add_argument('-k', '--count', dest='count', default=1, type=int,
+                            help='Number of matching seeds to find.  Default: %(default)s')
+
+        parser.add_argument('-s', '--start', dest='start', type=int,
+                            help='First seed to check.  Default: random')
+
+        parser.add_argument('-n', '--limit', dest='limit', default=100000, type=int,
+                            help='Maximum number of seeds to check.  Default: %(default)s')
+
+        parser.add_argument('-w', '--workers', dest='workers', default=os.cpu_count(), type=int,
+                            help='Number of worker processes.  Default: %(default)s')
+
+    def handle(self, *args, **options):
+        start = options['start']
+        if start is None:
+            start = random.SystemRandom().getrandbits(32)
+
+        self.stdout.write("Searching from seed {} for: {}".format(start, ', '.join(options['predicates'])))
+
+        def progress(stats):
+            self.stdout.write("Checked {} seeds, {} matches, {:.1f} seeds/s".format(
+                stats['checked'], stats['matched'], stats['per_second']), ending='\r')
+
+        try:
+            matches, stats = search(options['mode'], options['flags'], options['predicates'], options['count'], start,
+                                    options['limit'], options['workers'], progress=progress)
+        except (ValueError, FlagError) as e:
+            raise CommandError(e.args[0])
+
+        # Blank line for newline.
+        self.stdout.write('')
+
+        for seed in matches:
+            self.stdout.write("Seed {}".format(seed))
+
+        self.stdout.write("Checked {} seeds in {:.1f}s ({:.1f} seeds/s), {} matches, {} errors".format(
+            stats['checked'], stats['elapsed'], stats['per_second'], stats['matched'], stats['errors']))
+        for phase, rejected in stats['rejected'].items():
+            if rejected:
+                self.stdout.write("    rejected after {}: {}".format(phase, rejected))
+
+        if len(matches) < options['count']:
+            raise CommandError("Only found {} of {} seeds".format(len(matches), options['count']))
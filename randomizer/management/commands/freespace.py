@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from randomizer.logic.flags import FlagError
+from randomizer.logic.main import GameWorld, get_settings
+
+
+class Command(BaseCommand):
+    help = 'Generate a seed and report how much of the free space for text and scripts it uses.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('-s', '--seed', dest='seed', default=1, type=int,
+                            help='Seed number to generate.  Default: %(default)s')
+
+        parser.add_argument('-m', '--mode', dest='mode', default='open', choices=['linear', 'open'],
+                            help='Mode to generate.  Default: %(default)s')
+
+        parser.add_argument('-f', '--flags', dest='flags', default='',
+                            help='Flags string (from website).')
+
+    def handle(self, *args, **options):
+        try:
+            world = GameWorld(options['seed'], get_settings(options['mode'], False, options['flags']))
+            world.randomize()
+            world.build_patch()
+        except FlagError as e:
+            raise CommandError(e.args[0])
+
+        self.stdout.write("{:<16} {:>6} {:>7} {:>7} {:>7} {:>8} {:>8} {:>6}".format(
+            'Allocator', 'Bank', 'Total', 'Used', 'Free', 'Regions', 'Largest', 'Frag'))
+        for name, free_space in world.free_space.items():
+            for bank in free_space.report():
+                self.stdout.write("{:<16} {:>#6x} {:>7} {:>7} {:>7} {:>8} {:>8} {:>6.1%}".format(
+                    name, bank['bank'], bank['total'], bank['used'], bank['free'], bank['regions'], bank['largest'],
+                    bank['fragmentation']))
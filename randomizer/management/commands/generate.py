@@ -0,0 +1,260 @@
+import concurrent.futures
+import functools
+import hashlib
+import mmap
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from randomizer.logic.flags import FlagError
+from randomizer.logic.main import GameWorld, get_settings, VERSION
+
+# Size of SMRPG ROM is 4MB
+ROM_SIZE = 1024 * 1024 * 4
+
+# MD5 checksums of the supported vanilla ROMs for each region, after padding to the full ROM size.
+ROM_CHECKSUMS = {
+    'd0b68d68d9efc0558242f5476d1c5b81': 'US',
+    '107f383682bea1cef45b0b3f5baef3f4': 'EU',
+}
+
+# Address of the checksum complement and checksum in the ROM header.
+CHECKSUM_ADDRESS = 0x7fdc
+
+PATCHES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'patches')
+
+# Vanilla ROM data and the sum of its bytes, loaded once for each worker process.
+_vanilla_rom = None
+_vanilla_sum = 0
+
+
+@functools.lru_cache(maxsize=None)
+def parse_ips(mode):
+    """Parse the base IPS patch for a mode.  Parsed once per process and reused for every seed.
+
+    Args:
+        mode (str): Mode to get the patch for.
+
+    Returns:
+        list[tuple[int, bytes]]: Address and data for each record, in the order they're applied.
+
+    """
+    with open(os.path.join(PATCHES_DIR, '{}_mode.ips'.format(mode)), 'rb') as f:
+        ips = f.read()
+
+    if ips[:5] != b'PATCH':
+        raise ValueError("File does not begin with PATCH header")
+
+    records = []
+    pos = 5
+    while ips[pos:pos + 3] != b'EOF':
+        offset = int.from_bytes(ips[pos:pos + 3], 'big')
+        size = int.from_bytes(ips[pos + 3:pos + 5], 'big')
+        pos += 5
+
+        # Check for RLE
+        if not size:
+            rle_size = int.from_bytes(ips[pos:pos + 2], 'big')
+            records.append((offset, ips[pos + 2:pos + 3] * rle_size))
+            pos += 3
+        else:
+            records.append((offset, ips[pos:pos + size]))
+            pos += size
+
+    return records
+
+
+def get_patch_records(patch):
+    """
+    Args:
+        patch (randomizer.logic.patch.Patch): Seed patch.
+
+    Returns:
+        list[tuple[int, bytes]]: Address and data for each part of the patch, in address order.
+
+    """
+    records = []
+    for addr in sorted(patch.addresses):
+        data = patch.get_data(addr)
+        if isinstance(data, int):
+            data = bytes([data & 0xff])
+        records.append((addr, bytes(data)))
+    return records
+
+
+def write_ips(f, records, rom):
+    """Write records as an IPS patch file.
+
+    Args:
+        f: File object to write to.
+        records (list[tuple[int, bytes]]): Address and data for each record, in the order they're applied.
+        rom (bytearray|mmap.mmap): Final ROM data, to fix up records at an address IPS can't represent.
+
+    """
+    f.write(b'PATCH')
+    for addr, data in records:
+        for start in range(0, len(data), 0xffff):
+            chunk = data[start:start + 0xffff]
+            chunk_addr = addr + start
+
+            # Address 0x454f46 reads as the EOF marker, so start the record one byte earlier.
+            if chunk_addr == 0x454f46:
+                chunk_addr -= 1
+                chunk = rom[chunk_addr:chunk_addr + 1] + chunk
+
+            f.write(chunk_addr.to_bytes(3, 'big'))
+            f.write(len(chunk).to_bytes(2, 'big'))
+            f.write(chunk)
+    f.write(b'EOF')
+
+
+def _init_worker(rom_path):
+    """Load the vanilla ROM once for this worker process.
+
+    Args:
+        rom_path (str): Path to the vanilla ROM.
+
+    """
+    global _vanilla_rom, _vanilla_sum
+    with open(rom_path, 'rb') as f:
+        _vanilla_rom = f.read().ljust(ROM_SIZE, b'\x00')
+    _vanilla_sum = sum(_vanilla_rom)
+
+
+def _build_seed(seed, mode, flag_string, region, output_dir, formats):
+    """Generate a seed and write its patched ROM and/or IPS patch.
+
+    Args:
+        seed (int): Seed number.
+        mode (str): Mode to generate.
+        flag_string (str): Flag string.
+        region (str): Region of the vanilla ROM.
+        output_dir (str): Directory to write files to.
+        formats (list[str]): File formats to write, sfc and/or ips.
+
+    Returns:
+        tuple[int, str, list[str]]: Seed, hash, and paths of the files written.
+
+    """
+    world = GameWorld(seed, get_settings(mode, False, flag_string))
+    world.randomize()
+    records = parse_ips(mode) + get_patch_records(world.build_patch())
+
+    name = os.path.join(output_dir, 'SMRPG_{}_{}_{}_{}_{}'.format(region, VERSION, mode, world.hash, seed))
+    written = []
+
+    # Patch the ROM into a memory mapped output file, or in memory if we only need the IPS.
+    if 'sfc' in formats:
+        sfc = open(name + '.sfc', 'w+b')
+        sfc.truncate(ROM_SIZE)
+        rom = mmap.mmap(sfc.fileno(), ROM_SIZE)
+        written.append(name + '.sfc')
+    else:
+        sfc = None
+        rom = bytearray(ROM_SIZE)
+
+    try:
+        rom[:] = _vanilla_rom
+
+        # Keep a running sum of the bytes for the checksum instead of adding up the whole ROM at the end.
+        total = _vanilla_sum
+        for addr, data in records:
+            total += sum(data) - sum(rom[addr:addr + len(data)])
+            rom[addr:addr + len(data)] = data
+
+        checksum = total & 0xffff
+        inverse = checksum ^ 0xffff
+        checksum_data = bytes([inverse & 0xff, inverse >> 8, checksum & 0xff, checksum >> 8])
+        rom[CHECKSUM_ADDRESS:CHECKSUM_ADDRESS + 4] = checksum_data
+        records.append((CHECKSUM_ADDRESS, checksum_data))
+
+        if 'ips' in formats:
+            with open(name + '.ips', 'wb') as f:
+                write_ips(f, records, rom)
+            written.append(name + '.ips')
+    finally:
+        if sfc is not None:
+            rom.close()
+            sfc.close()
+
+    return seed, world.hash, written
+
+
+class Command(BaseCommand):
+    help = 'Generate patched ROMs and/or IPS patches for a batch of seeds, without using the database.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('rom', help='Path to vanilla US or EU ROM.')
+
+        parser.add_argument('-s', '--seeds', dest='seeds', nargs='+', type=int,
+                            help='Seed numbers to generate.  If not provided, random seeds will be used.')
+
+        parser.add_argument('-c', '--count', dest='count', default=1, type=int,
+                            help='Number of random seeds to generate if seeds are not provided.  Default: %(default)s')
+
+        parser.add_argument('-m', '--mode', dest='mode', default='open', choices=['linear', 'open'],
+                            help='Mode to generate.  Default: %(default)s')
+
+        parser.add_argument('-f', '--flags', dest='flags', default='',
+                            help='Flags string (from website).')
+
+        parser.add_argument('-o', '--output', dest='output_dir', default='.',
+                            help='Directory to write files to.  Default: current directory')
+
+        parser.add_argument('--format', dest='formats', nargs='+', default=['sfc'], choices=['sfc', 'ips'],
+                            help='File formats to write.  Default: %(default)s')
+
+        parser.add_argument('-w', '--workers', dest='workers', default=os.cpu_count(), type=int,
+                            help='Number of worker processes.  Default: %(default)s')
+
+    def handle(self, *args, **options):
+        with open(options['rom'], 'rb') as f:
+            rom = f.read().ljust(ROM_SIZE, b'\x00')
+        region = ROM_CHECKSUMS.get(hashlib.md5(rom).hexdigest())
+        if region is None:
+            raise CommandError("{} is not a vanilla US or EU ROM".format(options['rom']))
+        del rom
+
+        try:
+            flag_string = get_settings(options['mode'], False, options['flags']).flag_string
+        except FlagError as e:
+            raise CommandError(e.args[0])
+
+        seeds = options['seeds']
+        if not seeds:
+            sysrand = random.SystemRandom()
+            seeds = [sysrand.getrandbits(32) for _ in range(options['count'])]
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+
+        self.stdout.write("Generating {} seeds of version {}, {} mode, flags {!r}".format(
+            len(seeds), VERSION, options['mode'], flag_string))
+        start = time.time()
+        failed = 0
+
+        # Generation uses the global PRNG, so each worker has to be a separate process.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker,
+                                                    initargs=(options['rom'],)) as pool:
+            futures = {pool.submit(_build_seed, seed, options['mode'], flag_string, region, options['output_dir'],
+                                   options['formats']): seed for seed in seeds}
+
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    seed, hash, written = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write("ERROR generating seed {}: {!r}".format(futures[future], e))
+                else:
+                    self.stdout.write("Seed {} ({}): {}".format(seed, hash, ', '.join(written)))
+
+        self.stdout.write("Generated {} seeds in {:.1f} seconds".format(len(seeds) - failed, time.time() - start))
+        if failed:
+            raise CommandError("{} seeds failed".format(failed))
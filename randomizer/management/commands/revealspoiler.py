@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from randomizer.models import Seed
+
+
+class Command(BaseCommand):
+    help = 'Reveal the spoilers for race seeds once the race is over.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('hashes', nargs='+', help='Hashes of the race seeds to reveal.')
+
+    def handle(self, *args, **options):
+        count = Seed.objects.filter(hash__in=options['hashes'], race_mode=True).update(spoiler_revealed=True)
+        self.stdout.write("Revealed spoilers for {} race seeds".format(count))
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from randomizer.logic.flags import FlagError
+from randomizer.logic.main import GameWorld, get_settings
+from randomizer.logic.rngtrace import RandomTrace, first_divergence
+
+
+class Command(BaseCommand):
+    help = 'Generate a seed while counting random draws per phase, to check that logic changes keep the same random ' \
+           'stream.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('-s', '--seed', dest='seed', default=1, type=int,
+                            help='Seed number to generate.  Default: %(default)s')
+
+        parser.add_argument('-m', '--mode', dest='mode', default='open', choices=['linear', 'open'],
+                            help='Mode to generate.  Default: %(default)s')
+
+        parser.add_argument('-f', '--flags', dest='flags', default='',
+                            help='Flags string (from website).')
+
+        parser.add_argument('-o', '--output', dest='output',
+                            help='File to save the full trace to as JSON, to compare against later.')
+
+        parser.add_argument('-c', '--compare', dest='compare',
+                            help='Trace file from a previous run to compare against.')
+
+        parser.add_argument('-n', '--counts', dest='counts', action='store_true',
+                            help='Show draw counts for each call site.')
+
+    def handle(self, *args, **options):
+        world = GameWorld(options['seed'], get_settings(options['mode'], False, options['flags']))
+        trace = RandomTrace()
+        try:
+            with trace:
+                world.randomize(trace=trace)
+                trace.phase('patch')
+                world.build_patch()
+        except FlagError as e:
+            raise CommandError(e.args[0])
+
+        report = trace.report()
+        for name, phase in report.items():
+            self.stdout.write("{:<12} {:>6} draws  {}".format(name, phase['draws'], phase['digest']))
+            if options['counts']:
+                for line in phase['counts']:
+                    self.stdout.write("    " + line)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=1)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                other = json.load(f)
+
+            divergence = first_divergence(other, report)
+            if divergence is None:
+                self.stdout.write(self.style.SUCCESS("Random stream is identical to {}".format(options['compare'])))
+            elif divergence['index'] is None:
+                raise CommandError("Random stream differs in phase {} outside of traced draws".format(
+                    divergence['phase']))
+            else:
+                raise CommandError("Random stream first differs in phase {} at draw {}:\n  before: {}\n  now:    {}"
+                                   .format(divergence['phase'], divergence['index'], divergence['a'],
+                                           divergence['b']))
@@ -0,0 +1,122 @@
+import datetime
+import logging
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, OperationalError
+from django.utils import timezone
+
+from randomizer.logic.flags import FlagError
+from randomizer.logic.main import get_settings
+from randomizer.models import Job, Seed
+from randomizer.views import generate_seed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Process queued seed generation jobs from the API.'
+
+    def add_arguments(self, parser):
+        """Add optional arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('-w', '--workers', dest='workers', default=1, type=int,
+                            help='Number of worker processes.  Default: %(default)s')
+
+        parser.add_argument('-p', '--poll-interval', dest='poll_interval', default=1.0, type=float,
+                            help='Seconds to wait before checking again when the queue is empty.  Default: %(default)s')
+
+        parser.add_argument('--stale-after', dest='stale_after', default=600, type=int,
+                            help='Requeue running jobs started this many seconds ago, in case their worker died.  '
+                                 'Default: %(default)s')
+
+        parser.add_argument('--once', dest='once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for more jobs.')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Starting {} workers".format(options['workers']))
+
+        if options['workers'] <= 1:
+            self._work(options)
+            return
+
+        # Each worker process needs its own database connection.  Generation uses the global PRNG, so workers have to be
+        # separate processes instead of threads.
+        connections.close_all()
+        processes = [multiprocessing.Process(target=self._work, args=(options,)) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def _work(self, options):
+        """Process jobs until stopped, or until the queue is empty with the once option.
+
+        Args:
+            options (dict): Command options.
+
+        """
+        while True:
+            job = self._claim_job(options['stale_after'])
+            if job is not None:
+                self._run_job(job)
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll_interval'])
+
+    @staticmethod
+    def _claim_job(stale_after):
+        """Claim the oldest queued job.  Claiming is a conditional update, so only one worker can get each job.
+
+        Args:
+            stale_after (int): Seconds after which a running job is assumed to be abandoned and is requeued.
+
+        Returns:
+            randomizer.models.Job: Claimed job, or None if the queue is empty.
+
+        """
+        stale = timezone.now() - datetime.timedelta(seconds=stale_after)
+        Job.objects.filter(status=Job.RUNNING, started__lt=stale).update(status=Job.QUEUED, phase='')
+
+        for job in Job.objects.filter(status=Job.QUEUED).order_by('created')[:10]:
+            if Job.objects.filter(id=job.id, status=Job.QUEUED).update(status=Job.RUNNING, started=timezone.now()):
+                return job
+
+        return None
+
+    def _run_job(self, job):
+        """Generate the seed for this job and record the result.
+
+        Args:
+            job (randomizer.models.Job): Claimed job.
+
+        """
+        def progress(phase):
+            Job.objects.filter(id=job.id).update(phase=phase)
+
+        updates = {}
+        try:
+            result, _, _ = generate_seed(job.seed, get_settings(job.mode, job.debug_mode, job.flags), job.race_mode,
+                                         progress)
+        except FlagError as e:
+            updates.update(status=Job.FAILED, error=e.args[0])
+        except OperationalError:
+            # Database was busy, i.e. SQLite with several workers writing at once.  Put the job back to try again.
+            logger.warning("Database error generating job {}, requeueing".format(job.id))
+            Job.objects.filter(id=job.id).update(status=Job.QUEUED, phase='', started=None)
+            return
+        except Exception:
+            logger.exception("ERROR generating job {}, seed {!r}".format(job.id, job.seed))
+            updates.update(status=Job.FAILED, error='Error generating seed')
+        else:
+            updates.update(status=Job.DONE, result=Seed.objects.get(hash=result['hash']))
+
+        updates['finished'] = timezone.now()
+        Job.objects.filter(id=job.id).update(**updates)
+        self.stdout.write("Job {} {}".format(job.id, updates['status']))
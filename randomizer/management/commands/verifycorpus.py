@@ -0,0 +1,246 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from randomizer.logic.flags import ExcludeToadstool, PRESETS
+from randomizer.logic.main import GameWorld, Settings, VERSION
+from randomizer.logic.patch import PatchJSONEncoder
+from randomizer.management.commands.generatesample import ALL_FLAGS
+
+# Checked in corpus of expected results.
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'logic',
+                           'corpus.json')
+
+# Python version the results were generated with.  Generation depends on it, e.g. random.sample() on a set in
+# enemies.py depends on the order the set iterates in, so results from another version aren't expected to match.
+PYTHON_VERSION = '{}.{}'.format(*sys.version_info[:2])
+
+# Seeds to generate for the full flag sets, including the ends of the seed range.
+CORPUS_SEEDS = (1, 2, 12345, 99999999, 4294967295)
+
+# Max flags for open mode.  Open mode won't generate if every character or the starter is excluded, and the max start
+# choice is Toadstool, so exclude everyone else.
+OPEN_ALL_FLAGS = ' '.join(f.replace(ExcludeToadstool.value[1:], '') if f.startswith(ExcludeToadstool.value[0]) else f
+                          for f in ALL_FLAGS.split())
+
+# Size of the blocks the patch records are grouped in.
+BLOCK_BITS = 12
+
+# Hex digits of each record's offset in its block, and of its digest.
+OFFSET_DIGITS = 3
+DIGEST_DIGITS = 4
+RECORD_DIGITS = OFFSET_DIGITS + DIGEST_DIGITS
+
+
+def get_corpus_cases():
+    """
+    Returns:
+        list[tuple[int, str, bool, str]]: Seed, mode, debug mode and flag string for each corpus entry.  Covers no
+            flags, every preset and all flags at max level for each corpus seed, each top level flag on its own, and
+            debug mode.
+
+    """
+    cases = []
+    for mode in ('open', 'linear'):
+        all_flags = OPEN_ALL_FLAGS if mode == 'open' else ALL_FLAGS
+        flag_sets = [''] + [preset.flags for preset in PRESETS] + [all_flags]
+        for seed in CORPUS_SEEDS:
+            for flag_string in flag_sets:
+                cases.append((seed, mode, False, flag_string))
+
+        for flag_string in all_flags.split():
+            cases.append((CORPUS_SEEDS[0], mode, False, flag_string))
+
+        cases.append((CORPUS_SEEDS[0], mode, True, ''))
+    return cases
+
+
+def case_key(case):
+    """
+    Args:
+        case (tuple[int, str, bool, str]): Seed, mode, debug mode and flag string.
+
+    Returns:
+        str: Key for the case in the corpus.
+
+    """
+    seed, mode, debug_mode, flag_string = case
+    return '{}|{}|{}|{}'.format(seed, mode, 'debug' if debug_mode else 'normal', flag_string)
+
+
+def run_case(case):
+    """Generate one corpus case.
+
+    Args:
+        case (tuple[int, str, bool, str]): Seed, mode, debug mode and flag string.
+
+    Returns:
+        tuple[str, dict]: Key for the case, and the patch sha1, world hash, file select hash and the records of each
+            block of the patch.  Each record is its offset in the block and a short digest of its data, in hex.  If
+            generation fails, just the error instead.
+
+    """
+    seed, mode, debug_mode, flag_string = case
+    try:
+        world = GameWorld(seed, Settings(mode, debug_mode, flag_string))
+        world.randomize()
+        patch = world.build_patch()
+    except Exception as e:
+        return case_key(case), {'error': '{}: {}'.format(type(e).__name__, e)}
+
+    dump = json.dumps(patch, cls=PatchJSONEncoder)
+
+    blocks = {}
+    for addr in sorted(patch.addresses):
+        digest = hashlib.sha1(bytes(patch.get_data(addr))).hexdigest()[:DIGEST_DIGITS]
+        block = '{:x}'.format(addr >> BLOCK_BITS)
+        offset = '{:0{}x}'.format(addr & ((1 << BLOCK_BITS) - 1), OFFSET_DIGITS)
+        blocks[block] = blocks.get(block, '') + offset + digest
+
+    return case_key(case), {
+        'patch': hashlib.sha1(dump.encode('utf-8')).hexdigest(),
+        'hash': world.hash,
+        'file_select_hash': world.file_select_hash,
+        'blocks': blocks,
+    }
+
+
+def first_difference(expected, actual):
+    """
+    Args:
+        expected (dict): Expected result for a case.
+        actual (dict): New result for the case.
+
+    Returns:
+        str: Description of the first difference between the results, or None if they're the same.
+
+    """
+    if 'error' in expected or 'error' in actual:
+        if expected.get('error') != actual.get('error'):
+            return 'error {!r}, expected {!r}'.format(actual.get('error'), expected.get('error'))
+        return None
+
+    if expected['patch'] == actual['patch']:
+        for field in ('hash', 'file_select_hash'):
+            if expected[field] != actual[field]:
+                return '{} {!r}, expected {!r}'.format(field, actual[field], expected[field])
+        return None
+
+    expected_blocks, actual_blocks = expected['blocks'], actual['blocks']
+    for block in sorted(set(expected_blocks) | set(actual_blocks), key=lambda b: int(b, 16)):
+        if expected_blocks.get(block) == actual_blocks.get(block):
+            continue
+
+        expected_records = _block_records(block, expected_blocks.get(block, ''))
+        actual_records = _block_records(block, actual_blocks.get(block, ''))
+        for addr in sorted(set(expected_records) | set(actual_records)):
+            if addr not in expected_records:
+                return 'patch first differs at {:#08x}: unexpected record'.format(addr)
+            if addr not in actual_records:
+                return 'patch first differs at {:#08x}: missing record'.format(addr)
+            if expected_records[addr] != actual_records[addr]:
+                return 'patch first differs at {:#08x}: record data changed'.format(addr)
+    return 'patch differs in layout only'
+
+
+def _block_records(block, records):
+    """
+    Args:
+        block (str): Block number in hex.
+        records (str): Records of the block from run_case.
+
+    Returns:
+        dict[int, str]: Digest of each record by address.
+
+    """
+    start = int(block, 16) << BLOCK_BITS
+    result = {}
+    for i in range(0, len(records), RECORD_DIGITS):
+        record = records[i:i + RECORD_DIGITS]
+        result[start + int(record[:OFFSET_DIGITS], 16)] = record[OFFSET_DIGITS:]
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the determinism corpus and check that every seed still comes out the same.'
+
+    def add_arguments(self, parser):
+        """Add arguments.
+
+        Args:
+            parser (argparse.ArgumentParser): Parser
+
+        """
+        parser.add_argument('-w', '--workers', dest='workers', default=os.cpu_count(), type=int,
+                            help='Number of worker processes.  Default: %(default)s')
+
+        parser.add_argument('-c', '--corpus', dest='corpus', default=CORPUS_FILE,
+                            help='Corpus file.  Default: %(default)s')
+
+        parser.add_argument('--update', dest='update', action='store_true',
+                            help='Write the new results to the corpus.  Only allowed if nothing changed, the version '
+                                 'was bumped or the Python version is different since the corpus was written.')
+
+        parser.add_argument('--force', dest='force', action='store_true',
+                            help='Allow updating the corpus with changed results without a version bump.')
+
+    def handle(self, *args, **options):
+        corpus = {'version': None, 'python': PYTHON_VERSION, 'cases': {}}
+        if os.path.exists(options['corpus']):
+            with open(options['corpus']) as f:
+                corpus = json.load(f)
+        elif not options['update']:
+            raise CommandError("Corpus file {} doesn't exist, run with --update to create it".format(
+                options['corpus']))
+
+        same_python = corpus.get('python') == PYTHON_VERSION
+        if not same_python:
+            self.stdout.write(self.style.WARNING(
+                "Corpus was written with Python {}, but this is Python {}.  Mismatches won't fail the check.".format(
+                    corpus.get('python', 'unknown'), PYTHON_VERSION)))
+
+        cases = get_corpus_cases()
+        start = time.time()
+        if options['workers'] > 1:
+            with multiprocessing.Pool(options['workers']) as pool:
+                results = dict(pool.imap_unordered(run_case, cases))
+        else:
+            results = dict(run_case(case) for case in cases)
+        self.stdout.write("Generated {} cases in {:.1f}s".format(len(cases), time.time() - start))
+
+        mismatches = 0
+        for case in cases:
+            key = case_key(case)
+            if key not in corpus['cases']:
+                self.stdout.write("NEW      {}".format(key))
+                continue
+            difference = first_difference(corpus['cases'][key], results[key])
+            if difference:
+                mismatches += 1
+                self.stdout.write("MISMATCH {}: {}".format(key, difference))
+
+        if options['update']:
+            if mismatches and corpus['version'] == VERSION and same_python and not options['force']:
+                raise CommandError("{} cases changed without a version bump from {}, use --force to update "
+                                   "anyway".format(mismatches, VERSION))
+
+            with open(options['corpus'], 'w') as f:
+                json.dump({'version': VERSION, 'python': PYTHON_VERSION, 'cases': results}, f, indent=1,
+                          sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS("Wrote {} cases for version {} on Python {} to {}".format(
+                len(results), VERSION, PYTHON_VERSION, options['corpus'])))
+        elif mismatches and not same_python:
+            self.stdout.write(self.style.WARNING(
+                "{} of {} cases don't match the corpus for version {}, most likely because it was written with "
+                "Python {}".format(mismatches, len(cases), corpus['version'], corpus.get('python', 'unknown'))))
+        elif mismatches:
+            raise CommandError("{} of {} cases don't match the corpus for version {}".format(
+                mismatches, len(cases), corpus['version']))
+        else:
+            self.stdout.write(self.style.SUCCESS("All {} cases match".format(len(cases))))
@@ -0,0 +1,59 @@
+# Generated by Django 3.0.10 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+import zlib
+
+
+def move_spoilers_to_table(apps, schema_editor):
+    """Compress existing spoilers from the seed table into the spoiler table."""
+    Seed = apps.get_model('randomizer', 'Seed')
+    Spoiler = apps.get_model('randomizer', 'Spoiler')
+
+    # Read raw values since the old spoiler field clashes with the new one-to-one accessor on model instances.
+    batch = []
+    for seed_id, spoiler in Seed.objects.values_list('id', 'spoiler').iterator():
+        if spoiler:
+            batch.append(Spoiler(seed_id=seed_id, data=zlib.compress(json.dumps(spoiler).encode())))
+        if len(batch) >= 1000:
+            Spoiler.objects.bulk_create(batch)
+            batch = []
+    Spoiler.objects.bulk_create(batch)
+
+
+def move_spoilers_to_seeds(apps, schema_editor):
+    """Decompress spoilers back into the seed table."""
+    Seed = apps.get_model('randomizer', 'Seed')
+    Spoiler = apps.get_model('randomizer', 'Spoiler')
+
+    for spoiler in Spoiler.objects.iterator():
+        Seed.objects.filter(id=spoiler.seed_id).update(spoiler=json.loads(zlib.decompress(spoiler.data).decode()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('randomizer', '0008_race_mode_spoiler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Spoiler',
+            fields=[
+                ('seed', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                              serialize=False, to='randomizer.Seed')),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='seed',
+            name='spoiler_revealed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(move_spoilers_to_table, move_spoilers_to_seeds),
+        migrations.RemoveField(
+            model_name='seed',
+            name='spoiler',
+        ),
+    ]
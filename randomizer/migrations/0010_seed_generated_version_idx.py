@@ -0,0 +1,17 @@
+# Generated by Django 3.0.10 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('randomizer', '0009_spoiler_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seed',
+            index=models.Index(fields=['generated', 'version'], name='seed_generated_version_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.10 on 2026-10-18 22:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('randomizer', '0010_seed_generated_version_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True)),
+                ('finished', models.DateTimeField(null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('phase', models.CharField(default='', max_length=32)),
+                ('error', models.TextField(default='')),
+                ('seed', models.BigIntegerField()),
+                ('mode', models.CharField(max_length=16)),
+                ('debug_mode', models.BooleanField(default=False)),
+                ('flags', models.TextField(default='')),
+                ('race_mode', models.BooleanField(default=False)),
+                ('result', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='randomizer.Seed')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created'], name='job_status_created_idx'),
+        ),
+    ]
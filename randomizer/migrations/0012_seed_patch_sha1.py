@@ -0,0 +1,18 @@
+# Generated by Django 3.0.10 on 2026-10-19 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('randomizer', '0011_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seed',
+            name='patch_sha1',
+            field=models.CharField(default='', max_length=40),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import json
+import uuid
+import zlib
+
 from django.db import models
-from jsonfield import JSONField
 
 
 class Seed(models.Model):
@@ -13,7 +16,40 @@ class Seed(models.Model):
     file_select_char = models.CharField(max_length=100, default='')
     file_select_hash = models.CharField(max_length=100, default='')
     race_mode = models.BooleanField(default=False)
-    spoiler = JSONField(default={})
+    spoiler_revealed = models.BooleanField(default=False)
+    # SHA1 of the US patch JSON, to check patches regenerated on demand against.  Empty for seeds from before it was
+    # stored.
+    patch_sha1 = models.CharField(max_length=40, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['generated', 'version'], name='seed_generated_version_idx'),
+        ]
+
+
+class Spoiler(models.Model):
+    """Compressed spoiler for a seed, kept in its own table so fetching a seed's patch never loads it."""
+    seed = models.OneToOneField(Seed, on_delete=models.CASCADE, primary_key=True)
+    data = models.BinaryField()
+
+    @staticmethod
+    def compress(spoiler):
+        """
+        Args:
+            spoiler (dict): Spoiler data.
+
+        Returns:
+            bytes: Compressed JSON spoiler data for storage.
+        """
+        return zlib.compress(json.dumps(spoiler).encode())
+
+    @property
+    def spoiler(self):
+        """
+        Returns:
+            dict: Decompressed spoiler data.
+        """
+        return json.loads(zlib.decompress(self.data).decode())
 
 
 class Patch(models.Model):
@@ -26,3 +62,36 @@ class Patch(models.Model):
         unique_together = [
             ('seed', 'region'),
         ]
+
+
+class Job(models.Model):
+    """Queued seed generation request, processed by the runworkers command."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    phase = models.CharField(max_length=32, default='')
+    error = models.TextField(default='')
+    seed = models.BigIntegerField()
+    mode = models.CharField(max_length=16)
+    debug_mode = models.BooleanField(default=False)
+    flags = models.TextField(default='')
+    race_mode = models.BooleanField(default=False)
+    result = models.ForeignKey(Seed, null=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created'], name='job_status_created_idx'),
+        ]
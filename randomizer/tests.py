@@ -1,3 +1,386 @@
-from django.test import TestCase
+import concurrent.futures
+import hashlib
+import json
+import random
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import views
+from .data import dialogs
+from .logic import utils
+from .logic.flags import PRESETS
+from .logic.fragments import Fragment
+from .logic.main import GameWorld, get_settings
+from .logic.patch import Patch, PatchJSONEncoder
+from .logic.search import parse_predicate, search
+from .models import Job, Seed, Spoiler
+
+# Generation limits that don't get in the way of tests generating lots of seeds from one client.
+UNLIMITED_ADMISSION = {
+    'queue_size': 4,
+    'queue_timeout': 10.0,
+    'rate': None,
+    'burst': 10,
+}
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'patches': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-patches',
+    },
+}
+
+
+@override_settings(GENERATION_ADMISSION=UNLIMITED_ADMISSION, CACHES=LOCAL_CACHES)
+class SpoilerTests(TestCase):
+    def setUp(self):
+        views._ADMISSION = None
+
+    def generate(self, seed, flags, race_mode=False, query=''):
+        data = {'seed': str(seed), 'mode': 'open', 'flags': flags}
+        if race_mode:
+            data['race_mode'] = 'on'
+        response = self.client.post('/seed' + query, data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_regenerated_spoiler_matches_generated(self):
+        """Spoilers regenerated on demand are the same as the one the seed was generated with."""
+        for seed, flags in ((1, PRESETS[0].flags), (2, PRESETS[-1].flags), (3, '')):
+            generated = self.generate(seed, flags)
+            self.assertFalse(Spoiler.objects.filter(seed__hash=generated['hash']).exists())
+
+            response = self.client.get('/hash/{}/spoiler'.format(generated['hash']))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['spoiler'], generated['spoiler'])
+
+            # Now it's stored, the stored one is served and is still the same.
+            self.assertTrue(Spoiler.objects.filter(seed__hash=generated['hash']).exists())
+            response = self.client.get('/hash/{}/US'.format(generated['hash']))
+            self.assertEqual(response.json()['spoiler'], generated['spoiler'])
+
+    def test_stored_race_spoiler_matches_regenerated(self):
+        """Race spoilers are stored at generation time, and regenerating the seed gives the same spoiler."""
+        generated = self.generate(4, PRESETS[0].flags, race_mode=True)
+        self.assertEqual(generated['spoiler'], {})
+
+        s = Seed.objects.get(hash=generated['hash'])
+        stored = Spoiler.objects.get(seed=s).spoiler
+        world, _ = views._regenerate_world(s.hash, s.seed, s.mode, s.debug_mode, s.flags)
+        self.assertEqual(json.loads(json.dumps(world.spoiler)), stored)
+
+        # Sealed until it's revealed.
+        self.assertEqual(self.client.get('/hash/{}/US'.format(s.hash)).json()['spoiler'], {})
+        self.assertEqual(self.client.get('/hash/{}/spoiler'.format(s.hash)).status_code, 403)
+        Seed.objects.filter(id=s.id).update(spoiler_revealed=True)
+        self.assertEqual(self.client.get('/hash/{}/spoiler'.format(s.hash)).json()['spoiler'], stored)
+
+    def test_spoiler_opt_out(self):
+        """The spoiler is left out of responses when the client asks for spoiler=0."""
+        generated = self.generate(5, '', query='?spoiler=0')
+        self.assertNotIn('spoiler', generated)
+        response = self.client.get('/hash/{}/US?spoiler=0'.format(generated['hash']))
+        self.assertNotIn('spoiler', response.json())
+        self.assertFalse(Spoiler.objects.filter(seed__hash=generated['hash']).exists())
+
+
+@override_settings(GENERATION_ADMISSION=UNLIMITED_ADMISSION, CACHES=LOCAL_CACHES, STORE_PATCHES=False)
+class RegeneratedPatchTests(TestCase):
+    def setUp(self):
+        views._ADMISSION = None
+        self.forget_patches()
+
+    @staticmethod
+    def forget_patches():
+        views._REGENERATED.clear()
+        caches['patches'].clear()
+
+    def test_regenerated_patch_checked(self):
+        """Patches regenerated on demand are checked against the SHA1 stored when the seed was generated."""
+        response = self.client.post('/seed?spoiler=0', {'seed': '6', 'mode': 'open', 'flags': PRESETS[0].flags})
+        generated = response.json()
+        s = Seed.objects.get(hash=generated['hash'])
+        self.assertFalse(s.patch_set.exists())
+        self.assertEqual(s.patch_sha1, hashlib.sha1(json.dumps(generated['patch']).encode()).hexdigest())
+
+        self.forget_patches()
+        response = self.client.get('/hash/{}/US?spoiler=0'.format(s.hash))
+        self.assertEqual(response.json()['patch'], generated['patch'])
+
+        # A regenerated patch that doesn't match is never served.
+        self.forget_patches()
+        Seed.objects.filter(id=s.id).update(patch_sha1='0' * 40)
+        with self.assertRaises(ValueError):
+            self.client.get('/hash/{}/US?spoiler=0'.format(s.hash))
+        self.assertIsNone(caches['patches'].get(views._patch_cache_key(s.hash)))
+
+
+@override_settings(GENERATION_ADMISSION=UNLIMITED_ADMISSION, CACHES=LOCAL_CACHES, BATCH_API_KEYS=['key'],
+                   BATCH_CONCURRENCY=3)
+class BatchTests(TestCase):
+    def setUp(self):
+        views._ADMISSION = None
+
+    def test_parallel(self):
+        """Batches run BATCH_CONCURRENCY seeds at once, without waiting for generation slots."""
+        lock = threading.Lock()
+        counts = {'running': 0, 'most': 0}
+
+        def generate(index, *args):
+            with lock:
+                counts['running'] += 1
+                counts['most'] = max(counts['most'], counts['running'])
+            time.sleep(0.05)
+            with lock:
+                counts['running'] -= 1
+            return index, {'error': 'Skipped'}
+
+        seeds = [{'seed': str(seed), 'mode': 'open'} for seed in range(1, 10)]
+        with concurrent.futures.ThreadPoolExecutor(8) as pool, \
+                mock.patch.object(views, '_get_worker_pool', return_value=pool), \
+                mock.patch.object(views, '_generate_batch_seed', generate), \
+                views._get_admission().slot():
+            response = self.client.post('/api/v2/batch', json.dumps(seeds), content_type='application/json',
+                                        HTTP_X_API_KEY='key')
+            self.assertEqual(response.status_code, 200)
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(sorted(line['index'] for line in lines), list(range(len(seeds))))
+        self.assertEqual(counts['most'], 3)
+
+
+@override_settings(JOB_EVENT_STREAMS=1)
+class JobEventsTests(TestCase):
+    def test_stream_limit(self):
+        """Clients past the stream limit are told to poll the job, and closing a stream frees its place, even if it
+        never sent anything."""
+        job = Job.objects.create(seed=1, mode='open')
+        url = '/api/v2/jobs/{}/events'.format(job.id)
+
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertIn('/api/v2/jobs/{}'.format(job.id), response.json()['error'])
+
+        first.close()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class ConcurrentGenerationTests(SimpleTestCase):
+    def test_threads_match_serial(self):
+        """Seeds generated in request threads at the same time come out the same as generating them one at a time."""
+        world_settings = get_settings('open', False, PRESETS[0].flags)
+
+        def generate(seed):
+            return seed, json.dumps(views._generate_world(seed, world_settings)[1], cls=PatchJSONEncoder)
+
+        expected = dict(generate(seed) for seed in (11, 33))
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(generate, (11, 33, 11, 33)))
+        for seed, patch in results:
+            self.assertEqual(patch, expected[seed], seed)
+
+
+@override_settings(PACKING_TIMEOUT=0.05)
+class PackingTests(SimpleTestCase):
+    def test_compression_timeout(self):
+        """Packing gives up with a 503 instead of holding the request while the worker pool is busy."""
+        rom = b'\x00' * 0x7fc0 + b'SMRPG-R 1'.ljust(20)
+        template = mock.Mock(contents=[b'\x00' * 0x80 + b'IMET'])
+        with concurrent.futures.ThreadPoolExecutor(1) as pool, \
+                mock.patch.object(views, '_get_worker_pool', return_value=pool), \
+                mock.patch.object(views, '_compress_rom', lambda rom: time.sleep(0.5)), \
+                mock.patch.object(views, '_get_wad_template', return_value=template):
+            response = self.client.post('/pack', {
+                'region': 'US',
+                'rom': SimpleUploadedFile('rom.sfc', rom),
+                'wad': SimpleUploadedFile('base.wad', b'WAD'),
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(template.build.called)
+
+
+class DialogCompressionTests(SimpleTestCase):
+    @staticmethod
+    def replace_compress(string):
+        """Old compressor that applied the compression table one token at a time, to compare against.
+
+        Args:
+            string (str): Dialog text.
+
+        Returns:
+            str: Compressed string, null terminated.
+
+        """
+        for token, char in dialogs.compression_table:
+            string = string.replace(token, char)
+        return string + '\x00'
+
+    @staticmethod
+    def dialog_text():
+        """
+        Returns:
+            list[str]: Text of every wish, and every quiz question with each order of answers.
+
+        """
+        text = list(dialogs.wish_text)
+        for question in dialogs.get_quiz_questions() + dialogs.backfill_questions:
+            for wrong_answers in (question.wrong_answers, question.wrong_answers[::-1]):
+                for correct_index in range(3):
+                    answers = [''] * 3
+                    answers[correct_index] = question.correct_answer
+                    index_1, index_2 = dialogs.wrong_indexes[correct_index]
+                    answers[index_1], answers[index_2] = wrong_answers
+                    text.append(question.question + '\x03' + '\n'.join(' \x07  ' + answer for answer in answers))
+        return text
+
+    def test_round_trip(self):
+        """Every dialog string decompresses back to the same text, and is never longer than the old encoding."""
+        for string in self.dialog_text():
+            with self.subTest(string):
+                compressed = dialogs.compress(string)
+                self.assertEqual(dialogs.decompress(compressed), string)
+                self.assertTrue(compressed.endswith('\x00'))
+                self.assertLessEqual(len(compressed), len(self.replace_compress(string)))
+
+    def test_quiz_strings(self):
+        """Quiz strings built for the patch decompress to the question and answers in the right order."""
+        question = dialogs.Question('Who is Yoshi\'s nemesis?', 'Boshi', 'Broshi', 'Raz')
+        self.assertEqual(dialogs.decompress(question.get_string(1)),
+                         'Who is Yoshi\'s nemesis?\x03 \x07  Broshi\n \x07  Boshi\n \x07  Raz')
+
+    def test_overlapping_tokens(self):
+        """Overlapping tokens are resolved to the shortest encoding, and required replacements are always made."""
+        # Replacing in table order takes the four spaces first, which uses up the space " I " needs.
+        self.assertEqual(self.replace_compress('    I wish'), '\x0AI wish\x00')
+        self.assertEqual(dialogs.compress('    I wish'), '\x09\x14wish\x00')
+        for char in ('\n', "'", ':', '~'):
+            self.assertNotIn(char, dialogs.compress('a{}b'.format(char))[:-1])
+        self.assertEqual(dialogs.compress(''), '\x00')
+
+    def test_shortest_encoding(self):
+        """Replacing tokens in order gives the same encoding as the shortest path search, including random strings made
+        of overlapping tokens."""
+        encoder = dialogs._ENCODER
+        rng = random.Random(1)
+        pieces = [token for token, char in dialogs.compression_table] + list('abIMs .?') + [' I  I ', "'s to "]
+        strings = self.dialog_text() + [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+                                        for _ in range(20000)]
+        for string in strings:
+            self.assertEqual(encoder.encode(string), encoder.encode_shortest(string) + '\x00', string)
+
+
+class PoolStringsTests(SimpleTestCase):
+    def assertPooled(self, strings, stored, locations):
+        """Check that every input string can be read back from where pool_strings put it."""
+        for string in strings:
+            index, offset = locations[string]
+            self.assertEqual(stored[index][offset:], string)
+
+    def test_suffix_sharing(self):
+        """Strings that are the end of a longer string point into it instead of being stored again."""
+        strings = [b'Fire Bomb\x00', b'Bomb\x00', b'Ice Bomb\x00', b'mb\x00', b'Mushroom\x00', b'\x00']
+        stored, locations = utils.pool_strings(strings)
+        self.assertPooled(strings, stored, locations)
+        self.assertEqual(sorted(stored), [b'Fire Bomb\x00', b'Ice Bomb\x00', b'Mushroom\x00'])
+        self.assertEqual(locations[b'\x00'][1], len(stored[locations[b'\x00'][0]]) - 1)
+
+    def test_identical_strings(self):
+        """Identical strings are stored once and share a location."""
+        strings = [b'Geno\x00', b'Mallow\x00', b'Geno\x00', b'Geno\x00']
+        stored, locations = utils.pool_strings(strings)
+        self.assertPooled(strings, stored, locations)
+        self.assertEqual(sorted(stored), [b'Geno\x00', b'Mallow\x00'])
+
+    def test_empty(self):
+        """Empty strings are stored once, and no strings store nothing."""
+        self.assertEqual(utils.pool_strings([]), ([], {}))
+
+        strings = [b'\x00', b'\x00']
+        stored, locations = utils.pool_strings(strings)
+        self.assertEqual(stored, [b'\x00'])
+        self.assertEqual(locations, {b'\x00': (0, 0)})
+
+        # Without the null terminator, the empty string still points at the end of something.
+        strings = [b'abc', b'']
+        stored, locations = utils.pool_strings(strings)
+        self.assertPooled(strings, stored, locations)
+        self.assertEqual(stored, [b'abc'])
+
+    def test_shared_endings(self):
+        """Strings that only share an ending with each other, and not with a whole string, are stored separately."""
+        strings = [b'xab\x00', b'yab\x00', b'ab\x00', b'b\x00']
+        stored, locations = utils.pool_strings(strings)
+        self.assertPooled(strings, stored, locations)
+        self.assertEqual(sorted(stored), [b'xab\x00', b'yab\x00'])
+
+
+class FragmentTests(SimpleTestCase):
+    def test_copies_are_independent(self):
+        """Changing a fragment in place for one world doesn't change it for the next one."""
+        def build(world):
+            patch = Patch()
+            patch.add_data(0x10, bytearray(b'ab'))
+            patch.add_data(0x20, [1, 2])
+            return patch, {'used': []}
+
+        f = Fragment(build)
+        world = mock.Mock()
+        patch, state = f(world)
+        self.assertEqual(patch.get_data(0x10), b'ab')
+        self.assertIsInstance(patch.get_data(0x10), bytes)
+        self.assertIsInstance(patch.get_data(0x20), bytes)
+
+        patch.add_data(0x30, b'c')
+        patch.remove_data(0x10)
+        state['used'].append(1)
+        with self.assertRaises(TypeError):
+            patch.get_data(0x20)[0] = 5
+
+        patch, state = f(world)
+        self.assertEqual(sorted(patch.addresses), [0x10, 0x20])
+        self.assertEqual(patch.get_data(0x20), bytes([1, 2]))
+        self.assertEqual(state, {'used': []})
+
+
+class SearchTests(SimpleTestCase):
+    def assertMatches(self, mode, flag_string, predicate_texts, seeds):
+        """Every seed matches all the predicates when it's fully generated."""
+        for seed in seeds:
+            world = GameWorld(seed, get_settings(mode, False, flag_string))
+            world.randomize()
+            for text in predicate_texts:
+                self.assertTrue(parse_predicate(text, world).check(world), '{} {}'.format(seed, text))
+
+    def test_key_items_in_chests(self):
+        """Key items are placed with the chests when chests can have key items."""
+        predicates = ['item:ShedKey=key']
+        world = GameWorld(0, get_settings('open', False, 'Tc4k'))
+        self.assertEqual(parse_predicate(predicates[0], world).phase, 'chests')
+
+        seeds, stats = search('open', 'Tc4k', predicates, count=5, start=1)
+        self.assertEqual(len(seeds), 5)
+        self.assertEqual(stats['matched'], 5)
+        self.assertMatches('open', 'Tc4k', predicates, seeds)
+
+    def test_key_items(self):
+        predicates = ['item:ShedKey=key']
+        world = GameWorld(0, get_settings('open', False, 'K'))
+        self.assertEqual(parse_predicate(predicates[0], world).phase, 'keys')
+
+        seeds, _ = search('open', 'K', predicates, count=3, start=1)
+        self.assertEqual(len(seeds), 3)
+        self.assertMatches('open', 'K', predicates, seeds)
@@ -20,10 +20,17 @@ urlpatterns = [
     # Generation
     path('seed', views.GenerateView.as_view(), name='generate'),
     path('h/<slug:hash>', views.HashView.as_view(), name='patch-from-hash'),
+    path('hash/<slug:hash>/spoiler', views.SpoilerView.as_view(), name='spoiler-from-hash'),
     path('hash/<slug:hash>/<slug:region>', views.GenerateFromHashView.as_view(), name='generate-from-hash'),
+    path('p/<str:token>', views.TokenView.as_view(), name='patch-from-token'),
+    path('token/<str:token>/<slug:region>', views.GenerateFromTokenView.as_view(), name='generate-from-token'),
     path('pack', views.PackingView.as_view(), name='pack'),
 
     # API
     path('api/v1/generate', views.APIGenerateView.as_view(), name='api-v1-generate'),
     path('api/v1/flags', views.APIFlags.as_view(), name='api-v1-flags'),
+    path('api/v2/jobs', views.APIJobsView.as_view(), name='api-v2-jobs'),
+    path('api/v2/batch', views.APIBatchView.as_view(), name='api-v2-batch'),
+    path('api/v2/jobs/<uuid:id>', views.APIJobView.as_view(), name='api-v2-job'),
+    path('api/v2/jobs/<uuid:id>/events', views.APIJobEventsView.as_view(), name='api-v2-job-events'),
 ]
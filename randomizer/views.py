@@ -1,29 +1,40 @@
 import binascii
+import collections
+import concurrent.futures
+import contextlib
 import hashlib
+import hmac
 import json
 import logging
 import os
 import random
 import string
 import tempfile
-import shutil
+import threading
+import time
 
 import Wii
 import nlzss
 
 from django.conf import settings
-from django.db import transaction
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseNotFound, QueryDict
+from django.core import signing
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseForbidden, \
+    HttpResponseNotFound, QueryDict, StreamingHttpResponse
+from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView, FormView
 
-from .models import Seed, Patch
+from .models import Seed, Patch, Spoiler, Job
 from .forms import GenerateForm
 from .logic.flags import CATEGORIES, PRESETS, FlagError
-from .logic.main import GameWorld, Settings, VERSION
+from .logic.main import GameWorld, get_hash, get_settings, RANDOMIZE_PHASES, VERSION
 from .logic.patch import PatchJSONEncoder
 
 # Get an instance of a logger
@@ -66,11 +77,692 @@ for category in CATEGORIES:
         FLAGS.append(_build_flag_json_data(flag))
 
 
+# Precomputed response bodies for responses that are the same for every visitor, keyed by version.
+_RESPONSE_CACHE = {}
+
+
+def _cached_response(request, key, build_response):
+    """Serve a precomputed response body with an ETag, or 304 Not Modified if the client already has the current one.
+    The response is only built the first time it's requested for this key.
+
+    Args:
+        request (django.http.HttpRequest): Current request.
+        key (tuple): Cache key for the response.  Should include the version.
+        build_response: Function that builds the response on a cache miss.
+
+    Returns:
+        django.http.HttpResponse: Response to send.
+
+    """
+    try:
+        content, content_type, etag = _RESPONSE_CACHE[key]
+    except KeyError:
+        response = build_response()
+        if response.status_code != 200:
+            return response
+        if hasattr(response, 'render'):
+            response.render()
+        content = response.content
+        content_type = response['Content-Type']
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        _RESPONSE_CACHE[key] = (content, content_type, etag)
+
+    response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+# Format of the values in the patches cache.  Bump this whenever the value changes, so entries written in the old
+# format by a previous deploy are never read back as the new one.  1 was the bare patch JSON, 2 added the file select
+# character and hash.
+PATCH_CACHE_FORMAT = 2
+
+
+def _patch_cache_key(hash):
+    """
+    Args:
+        hash (str): Seed hash.
+
+    Returns:
+        str: Key for the patch in the patches cache, pinned to the current version and value format.
+
+    """
+    return 'patch{}-{}-{}'.format(PATCH_CACHE_FORMAT, VERSION, hash)
+
+
+# Generation seeds and draws from the process-global random module, so only one world can be generated at a time in each
+# process.  Anything else in the web process that uses the global random module has to hold this too.
+_RANDOM_LOCK = threading.Lock()
+
+
+def _generate_world(seed, world_settings, progress=None):
+    """Randomize a world and build its patch while holding the random lock.
+
+    Args:
+        seed (int): Seed number.
+        world_settings (randomizer.logic.main.Settings): Settings to generate with.
+        progress: Optional function called with the name of each phase as it starts.
+
+    Returns:
+        tuple[randomizer.logic.main.GameWorld, randomizer.logic.patch.Patch]: Randomized world and its patch.
+
+    """
+    with _RANDOM_LOCK:
+        world = GameWorld(seed, world_settings)
+        world.randomize(progress)
+        if progress is not None:
+            progress('build_patch')
+        return world, world.build_patch()
+
+
+def _regenerate_world(hash, seed, mode, debug_mode, flag_string, patch_sha1=''):
+    """Generate a current version seed again, the same way it was generated the first time.
+
+    Args:
+        hash (str): Seed hash.
+        seed (int): Seed number.
+        mode (str): Mode of the seed.
+        debug_mode (bool): Whether the seed was generated in debug mode.
+        flag_string (str): Flag string of the seed.
+        patch_sha1 (str): SHA1 of the patch JSON the seed was generated with, or empty if it isn't known.
+
+    Returns:
+        tuple[randomizer.logic.main.GameWorld, str]: Randomized world and its patch JSON data.
+
+    Raises:
+        ValueError: If the regenerated seed doesn't match the original hash or patch.
+
+    """
+    world, patch = _generate_world(seed, get_settings(mode, debug_mode, flag_string))
+    if world.hash != hash:
+        raise ValueError("Regenerated hash {!r} doesn't match seed hash {!r}".format(world.hash, hash))
+
+    patch_dump = json.dumps(patch, cls=PatchJSONEncoder)
+    regenerated_sha1 = hashlib.sha1(patch_dump.encode()).hexdigest()
+    if patch_sha1 and regenerated_sha1 != patch_sha1:
+        raise ValueError("Regenerated patch for hash {!r} has SHA1 {}, but it was generated with {}".format(
+            hash, regenerated_sha1, patch_sha1))
+    return world, patch_dump
+
+
+# Recently regenerated patches in this process, on top of the shared patches cache.
+_REGENERATED = collections.OrderedDict()
+_REGENERATED_LOCK = threading.Lock()
+_REGENERATED_SIZE = 32
+
+
+def _regenerate_patch(hash, seed, mode, debug_mode, flag_string, request=None):
+    """Regenerate the patch for a current version seed that doesn't have one stored.  Recently served patches are kept
+    in memory, and in the patches cache so other processes and restarts don't have to regenerate them.  Only an actual
+    regeneration goes through admission control, so serving a cached patch is never held up by generation load.
+
+    Args:
+        hash (str): Seed hash.
+        seed (int): Seed number.
+        mode (str): Mode of the seed.
+        debug_mode (bool): Whether the seed was generated in debug mode.
+        flag_string (str): Flag string of the seed.
+        request (django.http.HttpRequest): Request to admit if the patch has to be regenerated, or None if the caller
+            already holds a generation slot.
+
+    Returns:
+        tuple[str, str, str]: Patch JSON data, file select character, and file select hash.
+
+    Raises:
+        _Overloaded: If the patch has to be regenerated and the request isn't admitted.
+        ValueError: If the regenerated patch isn't the one the seed was generated with.
+
+    """
+    key = _patch_cache_key(hash)
+    with _REGENERATED_LOCK:
+        try:
+            _REGENERATED.move_to_end(key)
+            return _REGENERATED[key]
+        except KeyError:
+            pass
+
+    def regenerate():
+        regenerated = caches['patches'].get(key)
+        if regenerated is None:
+            # Never serve a different patch under the same hash, e.g. if the logic changed without a version bump.
+            patch_sha1 = Seed.objects.filter(hash=hash).values_list('patch_sha1', flat=True).first() or ''
+            with _admitted(request) if request is not None else contextlib.nullcontext():
+                world, patch_dump = _regenerate_world(hash, seed, mode, debug_mode, flag_string, patch_sha1)
+            regenerated = (patch_dump, world.file_select_character, world.file_select_hash)
+            caches['patches'].set(key, regenerated)
+        return regenerated
+
+    # Everyone opening the same permalink at once shares one regeneration.
+    regenerated = _GENERATIONS.do(('regenerate', hash), regenerate)
+
+    with _REGENERATED_LOCK:
+        _REGENERATED[key] = regenerated
+        while len(_REGENERATED) > _REGENERATED_SIZE:
+            _REGENERATED.popitem(last=False)
+    return regenerated
+
+
+# Salt to keep permalink token signatures separate from other uses of the secret key.
+PERMALINK_SALT = 'randomizer.permalink'
+
+
+def _build_permalink_token(seed, mode, debug_mode, flag_string, race_mode):
+    """Build a signed permalink token that has everything needed to regenerate the seed without a database lookup.
+
+    Args:
+        seed (int): Seed number.
+        mode (str): Mode of the seed.
+        debug_mode (bool): Whether the seed was generated in debug mode.
+        flag_string (str): Canonical flag string of the seed.
+        race_mode (bool): Whether the seed was generated for a race.
+
+    Returns:
+        str: URL safe signed token.
+
+    """
+    return signing.dumps([VERSION, seed, mode, flag_string, race_mode, debug_mode], salt=PERMALINK_SALT, compress=True)
+
+
+def _load_permalink_token(token):
+    """Validate a signed permalink token and get the seed data out of it.
+
+    Args:
+        token (str): Token from _build_permalink_token.
+
+    Returns:
+        tuple[str, int, str, str, bool, bool]: Version, seed, mode, flag string, race mode, and debug mode.
+
+    Raises:
+        django.core.signing.BadSignature: If the token wasn't signed by us or was modified.
+
+    """
+    version, seed, mode, flag_string, race_mode, debug_mode = signing.loads(token, salt=PERMALINK_SALT)
+    return version, seed, mode, flag_string, race_mode, debug_mode
+
+
+class _SingleFlight:
+    """Coalesces concurrent calls with the same key, so only the first one runs and the rest wait for its result."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Run func for this key, or wait for the call already running for it and share its result.
+
+        Args:
+            key: Key identifying identical calls.
+            func: Function to run if no call for this key is in flight.
+
+        Returns:
+            Result of func, shared by every caller that was waiting on it.
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+
+# Generations in flight in this process, keyed by seed hash.
+_GENERATIONS = _SingleFlight()
+
+
+@contextlib.contextmanager
+def _generation_lock(hash):
+    """Hold a database advisory lock for generating this hash, so other worker processes wait instead of generating
+    the same seed at the same time.  Other database backends only get the in-process coalescing.
+
+    Args:
+        hash (str): Seed hash.
+
+    """
+    if connection.vendor == 'postgresql':
+        key = int(hash[:15], 16)
+        acquire, release, params = 'SELECT pg_advisory_lock(%s)', 'SELECT pg_advisory_unlock(%s)', [key]
+    elif connection.vendor == 'mysql':
+        name = 'randomizer-{}'.format(hash)
+        acquire, release, params = 'SELECT GET_LOCK(%s, -1)', 'SELECT RELEASE_LOCK(%s)', [name]
+    else:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(acquire, params)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(release, params)
+
+
+class _Overloaded(Exception):
+    """Raised when a generation request is turned away instead of waiting for a free slot."""
+
+    def __init__(self, message, retry_after, status=503):
+        """
+        Args:
+            message (str): Error message for the response.
+            retry_after (int): Seconds the client should wait before trying again.
+            status (int): HTTP status code for the response.
+
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+    def response(self):
+        """
+        Returns:
+            django.http.JsonResponse: Error response in the same format as a flag error, with Retry-After set.
+
+        """
+        response = JsonResponse({'error': self.args[0]}, status=self.status)
+        response['Retry-After'] = str(self.retry_after)
+        return response
+
+
+class _AdmissionControl:
+    """Runs one generation at a time in this process, with a bounded queue of requests waiting for the slot and a token
+    bucket per client.  Generation holds a request thread for seconds at a time, so turning requests away early keeps
+    threads free for the cheap pages instead of piling them all up behind generation.
+    """
+
+    # Generations to run at once.  Generation uses the process-global random module (see _RANDOM_LOCK), so any more
+    # would only wait on the lock while holding a request thread.
+    concurrency = 1
+
+    # Most clients to track token buckets for, dropping the least recently seen ones past this.
+    max_clients = 10000
+
+    def __init__(self, queue_size, queue_timeout, rate, burst):
+        """
+        Args:
+            queue_size (int): Most requests to keep waiting for a slot once they're all in use.
+            queue_timeout (float): Seconds a queued request waits for a slot before giving up.
+            rate (float|None): Generations per second each client is allowed on average, or None for no limit.
+            burst (int): Generations a client can make at once before the rate applies.
+
+        """
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._buckets = collections.OrderedDict()
+
+        # Moving average of generation time, for estimating Retry-After.
+        self._avg_duration = 5.0
+
+    def _retry_after(self):
+        """
+        Returns:
+            int: Estimated seconds until a slot frees up for a new request, at least 1.
+
+        """
+        backlog = (self._waiting + 1) / max(self.concurrency, 1)
+        return max(1, int(backlog * self._avg_duration + 0.5))
+
+    def check_rate(self, client, cost=1):
+        """Take tokens from the client's bucket.  A cost bigger than the burst (i.e. a batch of seeds) is allowed once
+        the bucket is full, and leaves it in debt until the rate has paid for the whole cost.
+
+        Args:
+            client (str): Client identifier, usually the IP address.
+            cost (int): Number of generations to take tokens for.
+
+        Raises:
+            _Overloaded: If the client has used up its tokens.
+
+        """
+        if self.rate is None:
+            return
+
+        now = time.monotonic()
+        with self._cond:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            needed = min(cost, self.burst)
+            if tokens < needed:
+                self._buckets[client] = (tokens, now)
+                retry_after = max(1, int((needed - tokens) / self.rate + 0.5))
+                raise _Overloaded("Too many seeds generated, please wait a bit and try again.", retry_after, 429)
+
+            self._buckets[client] = (tokens - cost, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+    def acquire(self, wait=True):
+        """Take a generation slot.  Every acquire that succeeds must be matched by a release.
+
+        Args:
+            wait (bool): Wait in the queue for a slot if they're all in use, instead of giving up straight away.
+
+        Returns:
+            bool: True if a slot was taken, False if they were all in use and wait was False.
+
+        Raises:
+            _Overloaded: If waiting and the queue is full, or no slot freed up in time.
+
+        """
+        with self._cond:
+            if self._running >= self.concurrency:
+                if not wait:
+                    return False
+                if self._waiting >= self.queue_size:
+                    raise _Overloaded("The randomizer is busy, please try again shortly.", self._retry_after())
+
+                self._waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._running < self.concurrency, self.queue_timeout)
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    raise _Overloaded("The randomizer is busy, please try again shortly.", self._retry_after())
+
+            self._running += 1
+        return True
+
+    def release(self, duration):
+        """Give back a generation slot.
+
+        Args:
+            duration (float): Seconds the slot was held for, to update the Retry-After estimate.
+
+        """
+        with self._cond:
+            self._running -= 1
+            self._avg_duration += (duration - self._avg_duration) * 0.2
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Hold a generation slot, waiting in the queue for one if they're all in use.
+
+        Raises:
+            _Overloaded: If the queue is full, or no slot freed up in time.
+
+        """
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+
+_ADMISSION = None
+_ADMISSION_LOCK = threading.Lock()
+
+
+def _get_admission():
+    """
+    Returns:
+        _AdmissionControl: Admission control for generation in this process, from the GENERATION_ADMISSION setting.
+
+    """
+    global _ADMISSION
+    with _ADMISSION_LOCK:
+        if _ADMISSION is None:
+            # Older settings files still have a concurrency limit, but only one generation can run at a time.
+            options = {k: v for k, v in settings.GENERATION_ADMISSION.items() if k != 'concurrency'}
+            _ADMISSION = _AdmissionControl(**options)
+    return _ADMISSION
+
+
+def _client_id(request):
+    """
+    Args:
+        request (django.http.HttpRequest): Current request.
+
+    Returns:
+        str: Identifier of the client for rate limiting.
+
+    """
+    return request.META.get('REMOTE_ADDR', '')
+
+
+@contextlib.contextmanager
+def _admitted(request):
+    """Take a token from the client's rate limit and hold a generation slot, for generating outside of GenerateView.
+
+    Args:
+        request (django.http.HttpRequest): Request the generation is for.
+
+    Raises:
+        _Overloaded: If the client is over its rate limit or no slot is available.
+
+    """
+    admission = _get_admission()
+    admission.check_rate(_client_id(request))
+    with admission.slot():
+        yield
+
+
+def _parse_seed(seed):
+    """
+    Args:
+        seed (str): Seed value from the form, may be empty.
+
+    Returns:
+        int: Seed number to generate with.
+
+    """
+    # If seed is provided, use it.  Otherwise generate a random seed (10 digits max).
+    # For non-numeric values, take the CRC32 checksum of it.
+    if seed:
+        if seed.isdigit():
+            seed = int(seed)
+            if seed < 1 or seed > 0xFFFFFFFF:
+                seed = None
+        else:
+            seed = binascii.crc32(seed.encode())
+
+    # If seed is not provided, generate a 32 bit seed integer using the CSPRNG.
+    if not seed:
+        r = random.SystemRandom()
+        seed = r.getrandbits(32)
+        del r
+
+    return seed
+
+
+def generate_seed(seed, world_settings, race_mode, progress=None):
+    """Generate the seed and save it, or reuse it if another worker process just generated it.
+
+    Args:
+        seed (int): Seed number.
+        world_settings (randomizer.logic.main.Settings): Settings to generate with.
+        race_mode (bool): Whether the seed is for a race.
+        progress: Optional function called with the name of each phase as it starts.
+
+    Returns:
+        tuple[dict, object, dict]: Response data, patch data for the US version, and the spoiler.  The spoiler is None
+            if another process generated the seed.
+
+    """
+    hash = get_hash(seed, world_settings.mode, world_settings.flag_string)
+    started = timezone.now()
+
+    with _generation_lock(hash):
+        s = Seed.objects.filter(hash=hash, version=VERSION, debug_mode=world_settings.debug_mode,
+                                race_mode=race_mode, generated__gte=started).first()
+        if s is not None:
+            try:
+                patch_dump = Patch.objects.get(seed=s, region='US').patch
+            except Patch.DoesNotExist:
+                patch_dump = _regenerate_patch(s.hash, s.seed, s.mode, s.debug_mode, s.flags)[0]
+            return build_seed_result(s), json.loads(patch_dump), None
+
+        # Build game world, randomize it, and generate the patch.
+        world, patch = _generate_world(seed, world_settings, progress)
+        patches = {'US': patch}
+        patch_dumps = {region: json.dumps(patch, cls=PatchJSONEncoder) for region, patch in patches.items()}
+        patch_sha1s = {region: hashlib.sha1(dump.encode()).hexdigest() for region, dump in patch_dumps.items()}
+
+        # Save patch to the database (don't need to save EU since it's the same as US).
+        with transaction.atomic():
+            # If there's an existing seed with the same hash, replace it.
+            try:
+                s = Seed.objects.get(hash=world.hash)
+            except Seed.DoesNotExist:
+                pass
+            else:
+                s.delete()
+
+            s = Seed(hash=world.hash, seed=seed, version=VERSION, mode=world_settings.mode,
+                     debug_mode=world_settings.debug_mode, flags=world_settings.flag_string,
+                     file_select_char=world.file_select_character, file_select_hash=world.file_select_hash,
+                     race_mode=race_mode, patch_sha1=patch_sha1s['US'])
+            s.save()
+
+            # Spoilers are regenerated on demand for current version seeds, but race seeds are kept sealed until
+            # they're revealed which may be after a version change, so store their spoiler up front.
+            if race_mode:
+                Spoiler.objects.create(seed=s, data=Spoiler.compress(world.spoiler))
+
+            for region, patch_dump in patch_dumps.items():
+                # If we're not storing patches, keep it in the patches cache since it's likely to be fetched soon.
+                if not settings.STORE_PATCHES:
+                    caches['patches'].set(_patch_cache_key(world.hash),
+                                          (patch_dump, world.file_select_character, world.file_select_hash))
+                    continue
+
+                p = Patch(seed=s, region=region, sha1=patch_sha1s[region], patch=patch_dump)
+                p.save()
+
+    return build_seed_result(s), patches['US'], world.spoiler  # Patch for EU version is the same as US.
+
+
+def build_seed_result(s):
+    """
+    Args:
+        s (randomizer.models.Seed): Generated seed.
+
+    Returns:
+        dict: Response data for the generated seed, without the patch.
+
+    """
+    return {
+        'logic': s.version,
+        'seed': s.seed,
+        'hash': s.hash,
+        'mode': s.mode,
+        'debug_mode': s.debug_mode,
+        'flag_string': s.flags,
+        'file_select_character': s.file_select_char,
+        'file_select_hash': s.file_select_hash,
+        'permalink': reverse('randomizer:patch-from-hash', kwargs={'hash': s.hash}),
+        'signed_permalink': reverse('randomizer:patch-from-token', kwargs={'token': _build_permalink_token(
+            s.seed, s.mode, s.debug_mode, s.flags, s.race_mode)}),
+        'race_mode': s.race_mode,
+    }
+
+
+def _wants_spoiler(request):
+    """
+    Args:
+        request (django.http.HttpRequest): Generate or patch request.
+
+    Returns:
+        bool: Whether to include the spoiler in the response.  The v1 responses always had it, so it's included unless
+            the client asks for spoiler=0, like the site's own pages do since they fetch it from the spoiler endpoint.
+
+    """
+    return request.GET.get('spoiler') != '0'
+
+
+def _get_spoiler(s, request=None):
+    """Get the spoiler for a seed, regenerating and storing it if it isn't stored yet.
+
+    Args:
+        s (randomizer.models.Seed): Seed to get the spoiler for.
+        request (django.http.HttpRequest): Request to admit if the spoiler has to be regenerated, or None if the caller
+            already holds a generation slot.
+
+    Returns:
+        dict: Spoiler data, or None if it isn't stored and the seed is from a previous version so it can't be
+            regenerated.
+
+    Raises:
+        _Overloaded: If the spoiler has to be regenerated and the request isn't admitted.
+
+    """
+    try:
+        return Spoiler.objects.get(seed=s).spoiler
+    except Spoiler.DoesNotExist:
+        pass
+
+    # Spoilers can only be regenerated with the same logic version the seed was generated with.
+    if s.version != VERSION:
+        return None
+
+    # The spoiler is taken after building the patch, the same as when the seed was first generated.
+    with _admitted(request) if request is not None else contextlib.nullcontext():
+        world, _ = _regenerate_world(s.hash, s.seed, s.mode, s.debug_mode, s.flags, s.patch_sha1)
+    spoiler = world.spoiler
+    Spoiler.objects.get_or_create(seed=s, defaults={'data': Spoiler.compress(spoiler)})
+    return spoiler
+
+
+# Process pool for batch generation and ROM compression, created on first use.  Generation uses the global PRNG, so it
+# can't use threads.
+_WORKER_POOL = None
+
+
+def _get_worker_pool():
+    """
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: Process pool for batch generation and ROM compression.
+
+    """
+    global _WORKER_POOL
+    if _WORKER_POOL is None:
+        _WORKER_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=settings.GENERATION_WORKERS)
+    return _WORKER_POOL
+
+
 class RandomizerView(TemplateView):
     """
     Base class for views that generate a ROM, i.e. randomizer and patch-from-hash views.
     This gets common context data.
     """
+    # Whether the page is the same for every visitor, so it can be rendered once per version and served from memory.
+    cache_response = True
+
+    def get(self, request, *args, **kwargs):
+        if not self.cache_response:
+            return super().get(request, *args, **kwargs)
+        return _cached_response(request, (VERSION, request.path),
+                                lambda: super(RandomizerView, self).get(request, *args, **kwargs))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -110,10 +802,25 @@ class UpdatesView(RandomizerView):
 
 class RandomizeView(RandomizerView):
     template_name = 'randomizer/randomize.html'
+    # Contains a per-visitor CSRF token.
+    cache_response = False
 
 
 class HashView(RandomizerView):
     template_name = 'randomizer/patch_from_hash.html'
+    # Specific to the seed hash.
+    cache_response = False
+    # URL the page fetches the patch from, with the region added on the end.
+    patch_url_format = '/hash/{hash}/'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['patch_url'] = self.patch_url_format.format(**kwargs)
+        return context
+
+
+class TokenView(HashView):
+    patch_url_format = '/token/{token}/'
 
 
 class GenerateView(FormView):
@@ -127,33 +834,30 @@ class GenerateView(FormView):
         if not settings.DEBUG:
             data['debug_mode'] = False
 
-        # If seed is provided, use it.  Otherwise generate a random seed (10 digits max).
-        # For non-numeric values, take the CRC32 checksum of it.
-        seed = data['seed']
-        if seed:
-            if seed.isdigit():
-                seed = int(seed)
-                if seed < 1 or seed > 0xFFFFFFFF:
-                    seed = None
-            else:
-                seed = binascii.crc32(seed.encode())
-
-        # If seed is not provided, generate a 32 bit seed integer using the CSPRNG.
-        if not seed:
-            r = random.SystemRandom()
-            seed = r.getrandbits(32)
-            del r
-
+        seed = _parse_seed(data['seed'])
         mode = data['mode'] or 'open'
         debug_mode = bool(data['debug_mode'])
         race_mode = bool(data['race_mode'])
 
-        # Build game world, randomize it, and generate the patch.
-        world = GameWorld(seed, Settings(mode, debug_mode, data['flags'] or ''))
+        world_settings = get_settings(mode, debug_mode, data['flags'] or '')
+        hash = get_hash(seed, mode, world_settings.flag_string)
 
+        admission = _get_admission()
         try:
-            world.randomize()
-            patches = {'US': world.build_patch()}
+            admission.check_rate(_client_id(self.request))
+        except _Overloaded as e:
+            return e.response()
+
+        def generate():
+            with admission.slot():
+                return generate_seed(seed, world_settings, race_mode)
+
+        # Identical requests (i.e. everyone submitting the same seed at the start of a race) share one generation, and
+        # only the first one needs a generation slot.
+        try:
+            result, patch, spoiler = _GENERATIONS.do((hash, debug_mode, race_mode), generate)
+        except _Overloaded as e:
+            return e.response()
         except FlagError as e:
             # Catch error with flags and return that error message instead.
             result = {
@@ -164,46 +868,21 @@ class GenerateView(FormView):
             logger.error("ERROR form data: {!r}, generated seed: {!r}".format(data, seed))
             raise
 
-        # Send back patch data.
-        result = {
-            'logic': VERSION,
-            'seed': seed,
-            'hash': world.hash,
-            'mode': mode,
-            'debug_mode': debug_mode,
-            'flag_string': world.settings.flag_string,
-            'file_select_character': world.file_select_character,
-            'file_select_hash': world.file_select_hash,
-            'permalink': reverse('randomizer:patch-from-hash', kwargs={'hash': world.hash}),
-            'race_mode': race_mode,
-            'spoiler': world.spoiler if not race_mode else {},
-        }
-
-        # Save patch to the database (don't need to save EU since it's the same as US).
-        with transaction.atomic():
-            # If there's an existing seed with the same hash, replace it.
-            try:
-                s = Seed.objects.get(hash=world.hash)
-            except Seed.DoesNotExist:
-                pass
-            else:
-                s.delete()
-
-            s = Seed(hash=world.hash, seed=seed, version=VERSION, mode=mode, debug_mode=debug_mode,
-                     flags=world.settings.flag_string, file_select_char=world.file_select_character,
-                     file_select_hash=world.file_select_hash, race_mode=race_mode, spoiler=world.spoiler)
-            s.save()
-
-            for region, patch in patches.items():
-                patch_dump = json.dumps(patch, cls=PatchJSONEncoder)
-                h = hashlib.sha1()
-                h.update(patch_dump.encode())
-                p = Patch(seed=s, region=region, sha1=h.hexdigest(), patch=patch_dump)
-                p.save()
-
         # Check if we're including the patch data in the response.
+        result = dict(result)
         if self.return_patch_data:
-            result['patch'] = patches['US']  # Patch for EU version is the same as US.
+            result['patch'] = patch
+
+        # Race seeds keep the spoiler sealed.
+        if _wants_spoiler(self.request):
+            if race_mode:
+                spoiler = {}
+            elif spoiler is None:
+                try:
+                    spoiler = _get_spoiler(Seed.objects.get(hash=result['hash']), self.request) or {}
+                except _Overloaded as e:
+                    return e.response()
+            result['spoiler'] = spoiler
 
         return JsonResponse(result, encoder=PatchJSONEncoder)
 
@@ -233,9 +912,19 @@ class GenerateFromHashView(View):
             return HttpResponseNotFound("No record for hash {0!r}".format(hash))
 
         try:
-            p = Patch.objects.get(seed=s, region=region)
+            patch_dump = Patch.objects.get(seed=s, region=region).patch
         except Patch.DoesNotExist:
-            return HttpResponseNotFound("No patch found for hash {0!r}, region {1!r}".format(hash, region))
+            # Patches that weren't stored can only be regenerated with the same version the seed was generated with.
+            if s.version != VERSION:
+                return HttpResponseNotFound("Patch for hash {0!r} from version {1} is no longer available".format(
+                    hash, s.version))
+            elif region != 'US':
+                return HttpResponseNotFound("No patch found for hash {0!r}, region {1!r}".format(hash, region))
+
+            try:
+                patch_dump = _regenerate_patch(s.hash, s.seed, s.mode, s.debug_mode, s.flags, request)[0]
+            except _Overloaded as e:
+                return e.response()
 
         result = {
             'logic': s.version,
@@ -246,13 +935,192 @@ class GenerateFromHashView(View):
             'flag_string': s.flags,
             'file_select_character': s.file_select_char,
             'file_select_hash': s.file_select_hash,
-            'patch': json.loads(p.patch),
+            'patch': json.loads(patch_dump),
             'race_mode': s.race_mode,
-            'spoiler': s.spoiler,
+        }
+
+        # Race seeds keep the spoiler sealed until it's revealed.
+        if _wants_spoiler(request):
+            if s.race_mode and not s.spoiler_revealed:
+                result['spoiler'] = {}
+            else:
+                try:
+                    result['spoiler'] = _get_spoiler(s, request) or {}
+                except _Overloaded as e:
+                    return e.response()
+        return JsonResponse(result)
+
+
+class GenerateFromTokenView(View):
+    @staticmethod
+    def get(request, token, region):
+        """Get a patch via signed permalink token, regenerating it if needed instead of looking it up."""
+        try:
+            version, seed, mode, flag_string, race_mode, debug_mode = _load_permalink_token(token)
+        except signing.BadSignature:
+            return HttpResponseNotFound("Invalid permalink token {0!r}".format(token))
+
+        hash = get_hash(seed, mode, flag_string, version)
+
+        # Seeds from previous versions can't be regenerated, so use the stored patch if it was kept.
+        if version != VERSION:
+            return redirect('randomizer:generate-from-hash', hash=hash, region=region)
+
+        # EU patch is actually the US one.
+        if region not in ('US', 'EU'):
+            return HttpResponseNotFound("No patch found for hash {0!r}, region {1!r}".format(hash, region))
+
+        try:
+            patch_dump, file_select_character, file_select_hash = _regenerate_patch(
+                hash, seed, mode, debug_mode, flag_string, request)
+        except _Overloaded as e:
+            return e.response()
+
+        result = {
+            'logic': version,
+            'seed': seed,
+            'hash': hash,
+            'mode': mode,
+            'debug_mode': debug_mode,
+            'flag_string': flag_string,
+            'file_select_character': file_select_character,
+            'file_select_hash': file_select_hash,
+            'patch': json.loads(patch_dump),
+            'race_mode': race_mode,
         }
         return JsonResponse(result)
 
 
+class SpoilerView(View):
+    @staticmethod
+    def get(request, hash):
+        """Get the spoiler for a previously generated seed via hash value."""
+        try:
+            s = Seed.objects.get(hash=hash)
+        except Seed.DoesNotExist:
+            return HttpResponseNotFound("No record for hash {0!r}".format(hash))
+
+        if s.race_mode and not s.spoiler_revealed:
+            return HttpResponseForbidden("Spoiler for race seed {0!r} has not been revealed".format(hash))
+
+        try:
+            spoiler = _get_spoiler(s, request)
+        except _Overloaded as e:
+            return e.response()
+        if spoiler is None:
+            return HttpResponseNotFound("No spoiler found for hash {0!r}".format(hash))
+
+        result = {
+            'hash': s.hash,
+            'spoiler': spoiler,
+        }
+        return JsonResponse(result)
+
+
+def _compress_rom(rom):
+    """Compress ROM data for the US and EU Virtual Console.  Runs in the worker pool.
+
+    Args:
+        rom (bytes): ROM data.
+
+    Returns:
+        bytes: Compressed ROM data.
+
+    """
+    # The compressor only works on files.
+    with tempfile.TemporaryDirectory() as dumpdir:
+        romfile = os.path.join(dumpdir, 'rom.sfc')
+        romcompressed = os.path.join(dumpdir, 'rom_compressed.sfc')
+        with open(romfile, 'wb') as f:
+            f.write(rom)
+        nlzss.encode_file(romfile, romcompressed)
+        with open(romcompressed, 'rb') as f:
+            return f.read()
+
+
+class _WADTemplate:
+    """Decrypted and unpacked contents of a base WAD, to build randomized WADs from without unpacking it again."""
+
+    # Index of the content file with the U8 archive that has the ROM.
+    U8_INDEX = 5
+
+    def __init__(self, data):
+        """
+        Args:
+            data (bytes): WAD file data.
+
+        """
+        wad = Wii.WAD.load(data)
+        self.tmd = wad.tmd.dump()
+        self.tik = wad.tik.dump()
+        self.cert = wad.cert
+
+        # Decrypted contents are padded, so trim them to their real size.
+        self.contents = [wad.contents[i][:content.size] for i, content in enumerate(wad.tmd.getContents())]
+
+        # Find the ROM at the top level of the U8 archive.  File names come out of the archive as bytes.
+        self.u8_files = [(name.decode() if isinstance(name, bytes) else name, value)
+                         for name, value in Wii.U8.load(self.contents[self.U8_INDEX]).files]
+        self.rom_index = None
+        for i, (name, value) in enumerate(self.u8_files):
+            if value is not None and os.sep not in name and name.lower().endswith('.rom'):
+                self.rom_index = i
+                break
+
+    def build(self, rom):
+        """
+        Args:
+            rom (bytes): ROM data to put in the WAD.
+
+        Returns:
+            Wii.WAD: New WAD with the ROM replaced.
+
+        """
+        u8 = Wii.U8()
+        u8.files = list(self.u8_files)
+        if self.rom_index is not None:
+            u8.files[self.rom_index] = (u8.files[self.rom_index][0], rom)
+
+        wad = Wii.WAD()
+        wad.tmd = Wii.TMD.load(self.tmd)
+        wad.tik = Wii.Ticket.load(self.tik)
+        wad.cert = self.cert
+        wad.contents = list(self.contents)
+        wad.contents[self.U8_INDEX] = u8.dump()
+        return wad
+
+
+# Unpacked base WADs by SHA1, since players keep using the same ones.
+_WAD_TEMPLATES = collections.OrderedDict()
+_WAD_TEMPLATES_LOCK = threading.Lock()
+_WAD_TEMPLATES_SIZE = 4
+
+
+def _get_wad_template(data):
+    """
+    Args:
+        data (bytes): WAD file data.
+
+    Returns:
+        _WADTemplate: Unpacked WAD, cached by the SHA1 of the data.
+
+    """
+    key = hashlib.sha1(data).hexdigest()
+    with _WAD_TEMPLATES_LOCK:
+        try:
+            _WAD_TEMPLATES.move_to_end(key)
+            return _WAD_TEMPLATES[key]
+        except KeyError:
+            pass
+
+    template = _WADTemplate(data)
+    with _WAD_TEMPLATES_LOCK:
+        _WAD_TEMPLATES[key] = template
+        while len(_WAD_TEMPLATES) > _WAD_TEMPLATES_SIZE:
+            _WAD_TEMPLATES.popitem(last=False)
+    return template
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class PackingView(View):
     @staticmethod
@@ -263,103 +1131,81 @@ class PackingView(View):
         elif not request.FILES.get('wad'):
             return HttpResponseBadRequest("WAD file not provided")
 
-        with tempfile.TemporaryDirectory() as dumpdir:
-            romfile = os.path.join(dumpdir, 'rom.sfc')
-            with open(romfile, 'wb') as f:
-                shutil.copyfileobj(request.FILES['rom'], f)
-
-            # Compress ROM file for US and EU (not JP)
-            rom_to_copy = romfile
-            if request.POST.get('region') in ('US', 'EU'):
-                romcompressed = os.path.join(dumpdir, 'rom_compressed.sfc')
-                nlzss.encode_file(romfile, romcompressed)
-                rom_to_copy = romcompressed
-
-            # Dump WAD file
-            wadf = Wii.WAD.load(request.FILES['wad'].read())
-            wadf.dumpDir(dumpdir)
-
-            # Dump U8 archive
-            u8file = os.path.join(dumpdir, '00000005.app')
-            u8unpackdir = u8file + '_unpacked'
-            u8archive = Wii.U8.loadFile(u8file)
-            u8archive.dumpDir(u8unpackdir)
-
-            # Copy randomized ROM over
-            for f in os.listdir(u8unpackdir):
-                if f.lower().endswith(".rom"):
-                    wadrom = os.path.join(u8unpackdir, f)
-                    shutil.copyfile(rom_to_copy, wadrom)
-                    break
-
-            # Put U8 archive back together
-            newu8 = Wii.U8.loadDir(u8unpackdir)
-            newu8.dumpFile(u8file)
-
-            # Build new WAD
-            newwadfile = os.path.join(dumpdir, 'smrpg_randomized.wad')
-            newwad = Wii.WAD.loadDir(dumpdir)
-
-            # Make new channel title with seed (sync for all languages).
-            # Read title from ROM and make sure it's in the correct spot.  If not, leave the title alone.
-            with open(romfile, 'rb') as f:
-                f.seek(0x7fc0)
-                title = f.read(20).strip()
-                title = title.ljust(20)
-
-            if not title.startswith(b'SMRPG-R'):
-                return HttpResponseBadRequest("Bad ROM title {!r}".format(title))
+        rom = request.FILES['rom'].read()
+
+        # Read title from ROM and make sure it's in the correct spot.  If not, leave the title alone.
+        title = rom[0x7fc0:0x7fc0 + 20].strip()
+        title = title.ljust(20)
+
+        if not title.startswith(b'SMRPG-R'):
+            return HttpResponseBadRequest("Bad ROM title {!r}".format(title))
+
+        try:
+            seed = int(title[7:].strip())
+        except ValueError:
+            return HttpResponseBadRequest("Bad ROM title {!r}".format(title))
+
+        template = _get_wad_template(request.FILES['wad'].read())
+
+        # Read first content file data to find the channel title data and update it.
+        if template.contents[0][0x80:0x84] != b'IMET':
+            return HttpResponseBadRequest("Can't find IMET in WAD contents file")
 
+        # Compress ROM file for US and EU (not JP).  This runs in the worker pool, so packing can't use more CPU than
+        # the pool has however many requests come in, and the request gives up if it's queued behind too much else.
+        if request.POST.get('region') in ('US', 'EU'):
+            future = _get_worker_pool().submit(_compress_rom, rom)
             try:
-                seed = int(title[7:].strip())
-            except ValueError:
-                return HttpResponseBadRequest("Bad ROM title {!r}".format(title))
-
-            # Read first content file data to find the channel title data and update it.
-            if newwad.contents[0][0x80:0x84] != b'IMET':
-                return HttpResponseBadRequest("Can't find IMET in WAD contents file")
-
-            imetpos = 0x80
-            content = bytearray(newwad.contents[0])
-
-            # Channel names start 29 bytes after the "IMET" string, and there are 7 of them in a row.
-            jpos = imetpos + 29
-            for i in list(range(7)):
-                for j, char in enumerate(title):
-                    pos = jpos + (i * 84) + (j * 2)
-                    content[pos] = char
-
-            # Update MD5 hash for this content file.
-            data = content[64:1584]
-            data += b'\x00' * 16
-            md5 = Wii.Crypto.createMD5Hash(data)
-            for i in range(16):
-                content[1584 + i] = md5[i]
-
-            newwad.contents[0] = bytes(content)
-
-            # Generate random title ID for the WAD that doesn't conflict with existing channels.
-            choices = list(string.ascii_letters + string.digits)
-            # The first character of the four byte title ID should exclude existing ones to avoid conflicts.
-            first_char_choices = list(set(choices) -
-                                      {'C', 'D', 'E', 'F', 'G', 'H', 'J', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'W', 'X'})
-            first_char_choices.sort()
-
-            random.seed(seed)
-            new_id = bytearray([0x00, 0x01, 0x00, 0x01, ord(random.choice(first_char_choices))])
-            for i in range(3):
-                new_id.append(ord(random.choice(choices)))
-
-            tid = int.from_bytes(new_id, 'big')
-            newwad.tmd.setTitleID(tid)
-            newwad.tik.setTitleID(tid)
-
-            newwad.dumpFile(newwadfile, fakesign=False)
-
-            # Return new WAD file
-            response = HttpResponse(open(newwadfile, 'rb'), content_type='application/octet-stream')
-            response['Content-Disposition'] = 'attachment; filename="smrpg.wad"'
-            return response
+                rom = future.result(timeout=settings.PACKING_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                response = HttpResponse("The randomizer is busy, please try again shortly.", status=503)
+                response['Retry-After'] = str(max(1, int(settings.PACKING_TIMEOUT)))
+                return response
+
+        # Copy randomized ROM over
+        newwad = template.build(rom)
+
+        imetpos = 0x80
+        content = bytearray(newwad.contents[0])
+
+        # Channel names start 29 bytes after the "IMET" string, and there are 7 of them in a row.
+        jpos = imetpos + 29
+        for i in list(range(7)):
+            for j, char in enumerate(title):
+                pos = jpos + (i * 84) + (j * 2)
+                content[pos] = char
+
+        # Update MD5 hash for this content file.
+        data = content[64:1584]
+        data += b'\x00' * 16
+        md5 = Wii.Crypto.createMD5Hash(data)
+        for i in range(16):
+            content[1584 + i] = md5[i]
+
+        newwad.contents[0] = bytes(content)
+
+        # Generate random title ID for the WAD that doesn't conflict with existing channels.
+        choices = list(string.ascii_letters + string.digits)
+        # The first character of the four byte title ID should exclude existing ones to avoid conflicts.
+        first_char_choices = list(set(choices) -
+                                  {'C', 'D', 'E', 'F', 'G', 'H', 'J', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'W', 'X'})
+        first_char_choices.sort()
+
+        # Use a separate generator so this doesn't touch the global one generation is using.
+        rng = random.Random(seed)
+        new_id = bytearray([0x00, 0x01, 0x00, 0x01, ord(rng.choice(first_char_choices))])
+        for i in range(3):
+            new_id.append(ord(rng.choice(choices)))
+
+        tid = int.from_bytes(new_id, 'big')
+        newwad.tmd.setTitleID(tid)
+        newwad.tik.setTitleID(tid)
+
+        # Return new WAD file
+        response = HttpResponse(newwad.dump(fakesign=False), content_type='application/octet-stream')
+        response['Content-Disposition'] = 'attachment; filename="smrpg.wad"'
+        return response
 
 
 # ************** API views
@@ -389,4 +1235,352 @@ class APIFlags(View):
         data = {
             'flags': FLAGS,
         }
-        return JsonResponse(data)
+        return _cached_response(request, (VERSION, 'api-flags'), lambda: JsonResponse(data))
+
+
+# Phases reported for generation jobs, in order.
+JOB_PHASES = [phase for phase, _ in RANDOMIZE_PHASES] + ['build_patch']
+
+
+def _build_job_result(job):
+    """
+    Args:
+        job (randomizer.models.Job): Generation job.
+
+    Returns:
+        dict: Response data for the job status.
+
+    """
+    result = {
+        'id': str(job.id),
+        'status': job.status,
+        'phase': job.phase,
+        'phases': JOB_PHASES,
+        'url': reverse('randomizer:api-v2-job', kwargs={'id': job.id}),
+        'events': reverse('randomizer:api-v2-job-events', kwargs={'id': job.id}),
+    }
+    if job.status == Job.FAILED:
+        result['error'] = job.error
+    elif job.status == Job.DONE and job.result is not None:
+        result['result'] = build_seed_result(job.result)
+    return result
+
+
+class APIJobsView(APIGenerateView):
+    """Queue a generation job with the same fields as the generate API, to be processed by the runworkers command."""
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+
+        # Debug mode is only allowed if the server is running in debug mode for development.
+        if not settings.DEBUG:
+            data['debug_mode'] = False
+
+        mode = data['mode'] or 'open'
+        debug_mode = bool(data['debug_mode'])
+        world_settings = get_settings(mode, debug_mode, data['flags'] or '')
+
+        # Jobs run in the worker processes instead of taking a generation slot here, but still count against the
+        # client's rate limit.
+        try:
+            _get_admission().check_rate(_client_id(self.request))
+        except _Overloaded as e:
+            return e.response()
+
+        job = Job.objects.create(seed=_parse_seed(data['seed']), mode=mode, debug_mode=debug_mode,
+                                 flags=world_settings.flag_string, race_mode=bool(data['race_mode']))
+        return JsonResponse(_build_job_result(job), status=202)
+
+
+class APIJobView(View):
+    @staticmethod
+    def get(request, id):
+        """Poll the status of a generation job."""
+        try:
+            job = Job.objects.select_related('result').get(id=id)
+        except Job.DoesNotExist:
+            return HttpResponseNotFound("No job found for ID {0!r}".format(str(id)))
+
+        return JsonResponse(_build_job_result(job))
+
+
+class _ClosingIterator:
+    """Iterator that calls a function when it's closed.  A generator's finally block doesn't run if it's closed before
+    it starts, so this is used when something has to be released however the response ends.
+    """
+
+    def __init__(self, iterator, on_close):
+        """
+        Args:
+            iterator (collections.abc.Iterator): Iterator to wrap.
+            on_close (collections.abc.Callable): Called once, the first time the iterator is closed.
+
+        """
+        self._iterator = iterator
+        self._on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class APIJobEventsView(View):
+    # Seconds between checks of the job state, and how long to keep the stream open before the client has to reconnect.
+    poll_interval = 0.5
+    timeout = 300
+
+    # Seconds a client turned away because too many streams are open should wait between polls of the job.
+    retry_after = 2
+
+    # Number of streams open in this process.
+    _open_streams = 0
+    _lock = threading.Lock()
+
+    def get(self, request, id):
+        """Stream the progress of a generation job as server-sent events, ending once it's done or failed."""
+        if not Job.objects.filter(id=id).exists():
+            return HttpResponseNotFound("No job found for ID {0!r}".format(str(id)))
+
+        # Each stream holds a thread while it's open, so past the limit the client polls the job instead.
+        if not self._open_stream():
+            return _Overloaded("Too many job event streams are open, poll {} instead.".format(
+                reverse('randomizer:api-v2-job', kwargs={'id': id})), self.retry_after).response()
+
+        response = StreamingHttpResponse(_ClosingIterator(self._stream(id), self._close_stream),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _stream(self, id):
+        """
+        Args:
+            id (uuid.UUID): Job ID.
+
+        Yields:
+            str: Server-sent event for each change in the job status or phase.
+
+        """
+        last_state = None
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            job = Job.objects.select_related('result').get(id=id)
+            state = (job.status, job.phase)
+            if state != last_state:
+                last_state = state
+                yield 'event: {}\ndata: {}\n\n'.format(job.status, json.dumps(_build_job_result(job)))
+
+            if job.status in (Job.DONE, Job.FAILED):
+                return
+            time.sleep(self.poll_interval)
+
+    @classmethod
+    def _open_stream(cls):
+        """
+        Returns:
+            bool: True if there was room for another stream, which has to be closed with _close_stream().
+
+        """
+        with cls._lock:
+            if cls._open_streams >= settings.JOB_EVENT_STREAMS:
+                return False
+            cls._open_streams += 1
+            return True
+
+    @classmethod
+    def _close_stream(cls):
+        with cls._lock:
+            cls._open_streams -= 1
+
+
+def _generate_batch_seed(index, seed, mode, debug_mode, flag_string, race_mode):
+    """Generate one seed of a batch in a pool process.  Doesn't touch the database, the results are saved in bulk.
+
+    Args:
+        index (int): Index of the seed in the batch request.
+        seed (int): Seed number.
+        mode (str): Mode to generate.
+        debug_mode (bool): Debug mode flag.
+        flag_string (str): Canonical flag string.
+        race_mode (bool): Whether the seed is for a race.
+
+    Returns:
+        tuple[int, dict]: Index of the seed in the batch, and generated seed data or error message.
+
+    """
+    world = GameWorld(seed, get_settings(mode, debug_mode, flag_string))
+    try:
+        world.randomize()
+        patch_dump = json.dumps(world.build_patch(), cls=PatchJSONEncoder)
+    except FlagError as e:
+        return index, {'error': e.args[0]}
+    patch_sha1 = hashlib.sha1(patch_dump.encode()).hexdigest()
+
+    return index, {
+        'seed': Seed(hash=world.hash, seed=seed, version=VERSION, mode=mode, debug_mode=debug_mode,
+                     flags=flag_string, file_select_char=world.file_select_character,
+                     file_select_hash=world.file_select_hash, race_mode=race_mode, patch_sha1=patch_sha1),
+        'patch': patch_dump,
+        'spoiler': Spoiler.compress(world.spoiler) if race_mode else None,
+    }
+
+
+def _save_batch(generated):
+    """Save generated batch seeds with one bulk insert per table, replacing seeds with the same hashes.
+
+    Args:
+        generated (list[dict]): Generated seed data from _generate_batch_seed.
+
+    """
+    # Last one wins if the same seed was requested more than once.
+    by_hash = {g['seed'].hash: g for g in generated}
+
+    with transaction.atomic():
+        Seed.objects.filter(hash__in=by_hash.keys()).delete()
+        Seed.objects.bulk_create(g['seed'] for g in by_hash.values())
+
+        # Not every database gives back IDs from a bulk insert, so look them up to link the patches.
+        ids = dict(Seed.objects.filter(hash__in=by_hash.keys()).values_list('hash', 'id'))
+        for g in generated:
+            g['seed'].id = ids[g['seed'].hash]
+
+        Spoiler.objects.bulk_create(Spoiler(seed_id=ids[h], data=g['spoiler'])
+                                    for h, g in by_hash.items() if g['spoiler'] is not None)
+
+        if settings.STORE_PATCHES:
+            Patch.objects.bulk_create(Patch(seed_id=ids[h], region='US', sha1=g['seed'].patch_sha1, patch=g['patch'])
+                                      for h, g in by_hash.items())
+
+    # Keep patches in the cache if we're not storing them, since they're likely to be fetched soon.
+    if not settings.STORE_PATCHES:
+        caches['patches'].set_many({
+            _patch_cache_key(h): (g['patch'], g['seed'].file_select_char, g['seed'].file_select_hash)
+            for h, g in by_hash.items()
+        })
+
+
+def _batch_client(request):
+    """
+    Args:
+        request (django.http.HttpRequest): Batch request.
+
+    Returns:
+        str: Identifier of the client if it's allowed to generate batches, i.e. a staff user or a request with one of
+            the BATCH_API_KEYS in the X-API-Key header, otherwise None.
+
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return 'user:{}'.format(request.user.pk)
+
+    key = request.META.get('HTTP_X_API_KEY', '')
+    for i, allowed in enumerate(settings.BATCH_API_KEYS):
+        if key and hmac.compare_digest(key, allowed):
+            return 'key:{}'.format(i)
+    return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class APIBatchView(View):
+    """Generate a pool of seeds in parallel, streaming each result back as an NDJSON line as soon as it finishes.
+    Only staff users and clients with an API key can generate batches.
+    """
+    max_seeds = 500
+
+    def post(self, request):
+        client = _batch_client(request)
+        if client is None:
+            return HttpResponseForbidden("Batch generation needs an API key")
+
+        try:
+            specs = json.loads(request.body)
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Request body must be a JSON list of seeds to generate")
+        if isinstance(specs, dict):
+            specs = specs.get('seeds')
+        if not isinstance(specs, list) or not specs or not all(isinstance(spec, dict) for spec in specs):
+            return HttpResponseBadRequest("Request body must be a JSON list of seeds to generate")
+        if len(specs) > self.max_seeds:
+            return HttpResponseBadRequest("Batch can have at most {} seeds".format(self.max_seeds))
+
+        # Validate every seed before starting any generation.
+        jobs = []
+        for index, spec in enumerate(specs):
+            if spec.get('seed') is not None:
+                spec['seed'] = str(spec['seed'])
+            form = GenerateForm(data=spec)
+            if not form.is_valid():
+                return HttpResponseBadRequest("Seed {} form error: {}".format(index, '; '.join(form.errors)))
+
+            data = form.cleaned_data
+            mode = data['mode'] or 'open'
+            debug_mode = bool(data['debug_mode']) and settings.DEBUG
+            flag_string = get_settings(mode, debug_mode, data['flags'] or '').flag_string
+            jobs.append((index, _parse_seed(data['seed']), mode, debug_mode, flag_string, bool(data['race_mode'])))
+
+        # Every seed in the batch counts against the client's rate limit, the same as generating them one at a time.
+        try:
+            _get_admission().check_rate(client, len(jobs))
+        except _Overloaded as e:
+            return e.response()
+
+        response = StreamingHttpResponse(self._stream(jobs), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _stream(self, jobs):
+        """Generate the seeds in the worker pool, BATCH_CONCURRENCY at a time.  The pool processes don't use the random
+        module of this process, so batches don't take generation slots here, only the client's rate limit.
+
+        Args:
+            jobs (list[tuple]): Arguments for _generate_batch_seed for each seed.
+
+        Yields:
+            str: JSON line for each seed, with the index of the seed in the request.  Seeds that finish at the same
+                time are saved together, but nothing waits for other seeds before it's sent.
+
+        """
+        pool = _get_worker_pool()
+        pending = collections.deque(jobs)
+        running = {}
+
+        try:
+            while pending or running:
+                while pending and len(running) < settings.BATCH_CONCURRENCY:
+                    job = pending.popleft()
+                    running[pool.submit(_generate_batch_seed, *job)] = job
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                finished = []
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        finished.append(future.result())
+                    except Exception:
+                        logger.exception("ERROR generating batch seed: {!r}".format(job))
+                        finished.append((job[0], {'error': 'Error generating seed'}))
+
+                generated = [g for _, g in finished if 'error' not in g]
+                if generated:
+                    _save_batch(generated)
+
+                for index, g in finished:
+                    if 'error' in g:
+                        result = {'error': g['error']}
+                    else:
+                        result = build_seed_result(g['seed'])
+                    result['index'] = index
+                    yield json.dumps(result) + '\n'
+        finally:
+            # Don't keep generating seeds for a client that went away.
+            for future in running:
+                future.cancel()
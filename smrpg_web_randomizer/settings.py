@@ -146,3 +146,48 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 25  # 25 MB
 
 # Beta site flag.
 BETA = local.BETA
+
+# Whether to store the full patch for every generated seed.  When disabled, only the seed metadata is stored and
+# patches for current version seeds are regenerated on demand, using the patches cache to hold recent ones.
+STORE_PATCHES = getattr(local, 'STORE_PATCHES', True)
+
+# Number of processes used to generate seeds in parallel for batch requests, and to compress Virtual Console ROMs.
+GENERATION_WORKERS = getattr(local, 'GENERATION_WORKERS', os.cpu_count())
+
+# Most seeds each batch request generates at once in the worker processes.
+BATCH_CONCURRENCY = getattr(local, 'BATCH_CONCURRENCY', GENERATION_WORKERS)
+
+# Seconds a Virtual Console packing request waits for the worker processes to compress the ROM before giving up.
+PACKING_TIMEOUT = getattr(local, 'PACKING_TIMEOUT', 30)
+
+# Most job event streams each web server process keeps open at once.  Each one holds a request thread while it's open,
+# so clients past this get a 503 with Retry-After and should poll the job instead.
+JOB_EVENT_STREAMS = getattr(local, 'JOB_EVENT_STREAMS', 16)
+
+# API keys allowed to use the batch generation API, sent in the X-API-Key header.  Staff users can always use it.
+BATCH_API_KEYS = getattr(local, 'BATCH_API_KEYS', [])
+
+# Limits on seed generation in each web server process.  Generation uses the process-global random module, so only one
+# seed is generated at a time in each process.  Requests wait for it in a bounded queue of queue_size for up to
+# queue_timeout seconds, and anything past that gets a 503 with Retry-After.  Each client IP also gets a token
+# bucket of burst generations refilled at rate per second (None to disable), and gets a 429 once it's empty.
+GENERATION_ADMISSION = getattr(local, 'GENERATION_ADMISSION', {
+    'queue_size': 4,
+    'queue_timeout': 10.0,
+    'rate': 0.5,
+    'burst': 10,
+})
+
+CACHES = getattr(local, 'CACHES', {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'patches': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'patch_cache'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+})